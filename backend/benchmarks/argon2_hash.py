@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of Argon2 password hashing with the configured cost parameters.
+
+Reports single-thread hashing speed and the aggregate rate with as many threads as the app's
+hashing pool (`cpu_count // parallelism`, every hash runs `parallelism` lanes), per second and per core.
+
+Usage:
+    python -m benchmarks.argon2_hash [--time-cost N] [--memory-cost KiB] [--parallelism N] [--hashes N]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from passlib.context import CryptContext
+
+
+def measure(context: CryptContext, hashes: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(context.hash, ["Benchmark_Pass1!"] * hashes))
+    return hashes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Argon2 hashing micro-benchmark.")
+    parser.add_argument("--time-cost", type=int, default=config("argon2_time_cost", cast=int, default=3))
+    parser.add_argument("--memory-cost", type=int, default=config("argon2_memory_cost", cast=int, default=65536))
+    parser.add_argument("--parallelism", type=int, default=config("argon2_parallelism", cast=int, default=4))
+    parser.add_argument("--hashes", type=int, default=20, help="hashes per measurement")
+    args = parser.parse_args()
+
+    context = CryptContext(
+        schemes=["argon2"],
+        argon2__time_cost=args.time_cost,
+        argon2__memory_cost=args.memory_cost,
+        argon2__parallelism=args.parallelism,
+    )
+    context.hash("warm-up")
+
+    cores = os.cpu_count()
+    threads = max(1, cores // args.parallelism)
+    single = measure(context, args.hashes, 1)
+    aggregate = measure(context, args.hashes * threads, threads)
+    print(json.dumps({
+        "time_cost": args.time_cost,
+        "memory_cost_kib": args.memory_cost,
+        "parallelism": args.parallelism,
+        "cores": cores,
+        "threads": threads,
+        "single_thread_hashes_per_second": round(single, 2),
+        "hashes_per_second": round(aggregate, 2),
+        "hashes_per_second_per_core": round(aggregate / cores, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Load test of a running server with the scripted workloads from `benchmarks.workloads`.
+
+Runs each selected workload with `--concurrency` virtual users for `--duration` seconds and
+reports requests per second and p50/p99 latency per endpoint. The report is printed and
+written as JSON to `--output` (by default `benchmarks/results/<UTC time>.json`), together with
+the git commit and run parameters, so runs can be compared over time.
+
+The database must be seeded with `python -m benchmarks.seed` first. The server should run with
+`rate_limiter_enabled = False`, otherwise the per-client limits dominate the results.
+Access and refresh tokens are issued directly through `JwtManager` (using the `.env` settings),
+only the login burst pays for password hashing.
+
+Usage:
+    python -m benchmarks.load [--url http://localhost:8000] [--workloads feed,vote_storm,login_burst,token_churn]
+                              [--concurrency 50] [--duration 30] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+import asyncpg
+import httpx
+
+from config import JWT_SECRET, JWT_ALGORITHM, JWT_ACCESS_EXP, JWT_REFRESH_EXP, JWT_REDIS_INDEX, \
+    REDIS_HOST, REDIS_PORT, REDIS_PASS
+from models.database import DATABASE_URL
+from security.fastapi_jwt_redis import JwtManager
+
+from .seed import USER_PREFIX
+from .workloads import WORKLOADS, VirtualUser, Workload
+
+
+class Recorder:
+    """Latencies and response statuses per endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+
+    @asynccontextmanager
+    async def measure(self, endpoint: str):
+        status = "error"
+
+        def record(code: int):
+            nonlocal status
+            status = code
+
+        started_at = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.latencies[endpoint].append(time.perf_counter() - started_at)
+            self.statuses[endpoint][str(status)] += 1
+
+
+    def report(self, elapsed: float) -> Dict[str, dict]:
+        report = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            statuses = self.statuses[endpoint]
+            report[endpoint] = {
+                "requests": len(latencies),
+                "errors": sum(count for status, count in statuses.items() if not status.startswith(("2", "3"))),
+                "statuses": dict(statuses),
+                "requests_per_second": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+            }
+        return report
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def load_users() -> List[Tuple[int, str, str]]:
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        rows = await conn.fetch(
+            'SELECT id, name, email FROM "user" WHERE name LIKE $1 ORDER BY id', USER_PREFIX.replace("_", "\\_") + "%"
+        )
+    finally:
+        await conn.close()
+    return [tuple(row) for row in rows]
+
+
+async def run_workload(workload: Workload, url: str, concurrency: int, duration: float, seed: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await workload.setup(client)
+        recorder = Recorder()
+        deadline = time.monotonic() + duration
+
+        async def virtual_user(index: int):
+            vuser = VirtualUser(index, client, recorder, random.Random(seed * 100_003 + index))
+            while time.monotonic() < deadline:
+                try:
+                    if not await workload.step(vuser):
+                        break
+                except (httpx.HTTPError, ValueError, KeyError):
+                    # Failed requests are already recorded, malformed responses end the step
+                    pass
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+
+    return {
+        "concurrency": concurrency,
+        "duration_seconds": round(elapsed, 3),
+        "endpoints": recorder.report(elapsed),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    JwtManager.configure(
+        secret=JWT_SECRET,
+        algorithm=JWT_ALGORITHM,
+        access_expiration=JWT_ACCESS_EXP,
+        refresh_expiration=JWT_REFRESH_EXP,
+        redis_host=REDIS_HOST,
+        redis_port=REDIS_PORT,
+        redis_pass=REDIS_PASS,
+        redis_db_index=JWT_REDIS_INDEX
+    )
+    await JwtManager.connect()
+    try:
+        users = await load_users()
+        if not users:
+            raise SystemExit("No benchmark users found, run `python -m benchmarks.seed` first.")
+
+        results = {}
+        for name in args.workloads:
+            print(f"Running {name} ({args.concurrency} virtual users, {args.duration}s)...")
+            results[name] = await run_workload(WORKLOADS[name](users), args.url, args.concurrency, args.duration, args.seed)
+    finally:
+        await JwtManager.close()
+
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "url": args.url,
+        "seed": args.seed,
+        "users": len(users),
+        "workloads": results,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'workload':<12} {'endpoint':<22} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for workload, result in report["workloads"].items():
+        for endpoint, stats in result["endpoints"].items():
+            print(f"{workload:<12} {endpoint:<22} {stats['requests']:>9} {stats['errors']:>7} "
+                  f"{stats['requests_per_second']:>9} {stats['p50_ms']:>9} {stats['p99_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API with scripted workloads.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        type=lambda value: [name.strip() for name in value.split(",")],
+                        help=f"comma separated, any of: {', '.join(WORKLOADS)}")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per workload")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", help="JSON report path")
+    args = parser.parse_args()
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Synthetic data generator for benchmarks.
+
+Bulk loads users, polls, options and votes with `COPY` and then recomputes the
+denormalized vote counters in one pass. Generated users are named `bench_<n>`, with
+email `bench_<n>@example.com` and password `BENCHMARK_PASSWORD`, which the load
+workloads use to log in. The same `--seed` produces the same data.
+
+Usage:
+    python -m benchmarks.seed --users 10000 --polls 50000 --votes-per-poll 40 [--options 4] [--reset]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Tuple
+
+import asyncpg
+
+from config import ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM
+from models.database import DATABASE_URL, AsyncSessionLocal, async_engine
+from models.poll_votes import crud as voteCrud
+from security import pass_util
+
+
+BENCHMARK_PASSWORD = "Benchmark_Pass1!"
+USER_PREFIX = "bench_"
+
+TABLES = ("poll_votes", "poll_options", "poll", "user")
+
+
+async def next_id(conn: asyncpg.Connection, table: str) -> int:
+    return await conn.fetchval(f'SELECT COALESCE(MAX(id), 0) + 1 FROM "{table}"')
+
+
+async def sync_sequence(conn: asyncpg.Connection, table: str):
+    # Rows are copied with explicit ids, the id sequence has to continue after them
+    await conn.execute(
+        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"
+    )
+
+
+def generate_votes(
+        rng: random.Random, first_vote_id: int, users: range, polls: range, first_option_id: int,
+        options: int, votes_per_poll: int
+    ) -> Iterator[Tuple[int, int, int, int]]:
+    """Yield `(id, user_id, poll_id, poll_option_id)`, voters of a poll are distinct users."""
+    vote_id = first_vote_id
+    for i, poll_id in enumerate(polls):
+        for user_id in rng.sample(users, votes_per_poll):
+            yield vote_id, user_id, poll_id, first_option_id + i * options + rng.randrange(options)
+            vote_id += 1
+
+
+async def seed(users: int, polls: int, options: int, votes_per_poll: int, reset: bool, seed: int) -> dict:
+    rng = random.Random(seed)
+    timings = {}
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        if reset:
+            await conn.execute("TRUNCATE " + ", ".join(f'"{table}"' for table in TABLES) + " RESTART IDENTITY CASCADE")
+
+        # Every user gets the same password hash, hashing millions of passwords would dominate the run
+        password = await pass_util.get_password_hash(BENCHMARK_PASSWORD)
+        first_user, first_poll = await next_id(conn, "user"), await next_id(conn, "poll")
+        first_option, first_vote = await next_id(conn, "poll_options"), await next_id(conn, "poll_votes")
+        user_ids = range(first_user, first_user + users)
+        poll_ids = range(first_poll, first_poll + polls)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        started_at = time.perf_counter()
+        await conn.copy_records_to_table("user", columns=["id", "name", "email", "password"], records=(
+            (user_id, f"{USER_PREFIX}{user_id}", f"{USER_PREFIX}{user_id}@example.com", password)
+            for user_id in user_ids
+        ))
+        timings["users"] = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        await conn.copy_records_to_table("poll", columns=["id", "title", "created_at", "user_id", "vote_count"], records=(
+            (poll_id, f"Benchmark poll {poll_id}", now - timedelta(seconds=polls - i), rng.choice(user_ids), 0)
+            for i, poll_id in enumerate(poll_ids)
+        ))
+        await conn.copy_records_to_table("poll_options", columns=["id", "value", "poll_id", "vote_count"], records=(
+            (first_option + i * options + n, f"Option {n + 1}", poll_id, 0)
+            for i, poll_id in enumerate(poll_ids)
+            for n in range(options)
+        ))
+        timings["polls"] = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        await conn.copy_records_to_table("poll_votes", columns=["id", "user_id", "poll_id", "poll_option_id"], records=(
+            generate_votes(rng, first_vote, user_ids, poll_ids, first_option, options, min(votes_per_poll, users))
+        ))
+        timings["votes"] = time.perf_counter() - started_at
+
+        for table in TABLES:
+            await sync_sequence(conn, table)
+    finally:
+        await conn.close()
+
+    started_at = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        await voteCrud.reconcile_vote_counts(db)
+    await async_engine.dispose()
+    timings["vote_counters"] = time.perf_counter() - started_at
+
+    return {
+        "users": users,
+        "polls": polls,
+        "options": polls * options,
+        "votes": polls * min(votes_per_poll, users),
+        "seconds": {step: round(seconds, 3) for step, seconds in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic benchmark data.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--polls", type=int, default=10000)
+    parser.add_argument("--options", type=int, default=4, help="options per poll")
+    parser.add_argument("--votes-per-poll", type=int, default=20)
+    parser.add_argument("--reset", action="store_true", help="truncate all tables first")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    pass_util.configure(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+    result = asyncio.run(seed(args.users, args.polls, args.options, args.votes_per_poll, args.reset, args.seed))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Scripted workloads for `benchmarks.load`.
+
+A workload has an optional `setup`, run once before the measurement, and a `step`
+coroutine that each virtual user runs in a loop. A step returns `False` when the
+workload has nothing left to do for that user (e.g. every voter has voted).
+"""
+import random
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from security.fastapi_jwt_redis import JwtManager
+
+from .seed import BENCHMARK_PASSWORD
+
+
+class VirtualUser:
+    """One simulated client, its requests are timed by the recorder."""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder, rng: random.Random):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+
+
+    async def request(self, endpoint: str, method: str, url: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        headers = {}
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+        async with self.recorder.measure(endpoint) as record:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            record(response.status_code)
+        return response
+
+
+class Workload(ABC):
+    name: str
+    users: List[Tuple[int, str, str]]     # Seeded (id, name, email)
+
+    def __init__(self, users: List[Tuple[int, str, str]]):
+        self.users = users
+
+    async def setup(self, client: httpx.AsyncClient):
+        pass
+
+    @abstractmethod
+    async def step(self, vuser: VirtualUser) -> bool:
+        pass
+
+
+async def token_pair(user_id: int) -> Dict[str, str]:
+    # Tokens are issued directly, so workloads other than the login burst do not pay for Argon2
+    return await JwtManager.generate_token_pair({"user_id": user_id})
+
+
+class FeedBrowsing(Workload):
+    """Page through the feed, open a poll and its author's polls, and look up own votes."""
+
+    name = "feed"
+    pages = 3
+
+    async def setup(self, client: httpx.AsyncClient):
+        self.tokens = [(await token_pair(user_id))["access"] for user_id, _, _ in self.users[:100]]
+
+    async def step(self, vuser: VirtualUser) -> bool:
+        token = vuser.rng.choice(self.tokens)
+        cursor, polls = None, []
+        for _ in range(self.pages):
+            params = {"cursor": cursor} if cursor else {}
+            page = (await vuser.request("GET /polls/all", "GET", "/polls/all", params=params)).json()
+            polls.extend(page.get("polls", []))
+            cursor = page.get("next_cursor")
+            if cursor is None:
+                break
+        if not polls:
+            return True
+
+        poll = vuser.rng.choice(polls)
+        await vuser.request("GET /polls/", "GET", "/polls/", params={"poll_id": poll["id"]})
+        await vuser.request("GET /polls/user", "GET", "/polls/user", params={"username": poll["created_by"]})
+        await vuser.request("GET /polls/my-votes", "GET", "/polls/my-votes", token=token,
+            params={"poll_ids": ",".join(str(poll["id"]) for poll in polls[:100])})
+        return True
+
+
+class VoteStorm(Workload):
+    """Every seeded user votes once on the same freshly created poll."""
+
+    name = "vote_storm"
+
+    async def setup(self, client: httpx.AsyncClient):
+        author = await token_pair(self.users[0][0])
+        headers = {"Authorization": f"Bearer {author['access']}"}
+        poll = {"title": "Hot poll", "options": ["A", "B", "C", "D"]}
+        response = await client.post("/polls/", json=poll, headers=headers)
+        response.raise_for_status()
+        poll_id = response.json()["id"]
+        self.option_ids = [option["id"] for option in (await client.get("/polls/", params={"poll_id": poll_id})).json()[0]["options"]]
+        self.voters = iter(self.users)
+
+    async def step(self, vuser: VirtualUser) -> bool:
+        voter = next(self.voters, None)
+        if voter is None:
+            return False
+        token = (await token_pair(voter[0]))["access"]
+        await vuser.request("POST /polls/vote", "POST", "/polls/vote", token=token,
+            params={"option_id": vuser.rng.choice(self.option_ids)})
+        return True
+
+
+class LoginBurst(Workload):
+    """Log in as random seeded users."""
+
+    name = "login_burst"
+
+    async def step(self, vuser: VirtualUser) -> bool:
+        _, _, email = vuser.rng.choice(self.users)
+        await vuser.request("POST /users/login", "POST", "/users/login",
+            json={"email": email, "password": BENCHMARK_PASSWORD})
+        return True
+
+
+class TokenChurn(Workload):
+    """Refresh a token pair, then log out with the new access token."""
+
+    name = "token_churn"
+
+    async def step(self, vuser: VirtualUser) -> bool:
+        user_id, _, _ = vuser.rng.choice(self.users)
+        tokens = await token_pair(user_id)
+        response = await vuser.request("POST /users/refresh", "POST", "/users/refresh", token=tokens["refresh"])
+        if response.status_code == 200:
+            await vuser.request("POST /users/logout", "POST", "/users/logout", token=response.json()["access"])
+        return True
+
+
+WORKLOADS: Dict[str, Callable[[List[Tuple[int, str, str]]], Workload]] = {
+    workload.name: workload for workload in (FeedBrowsing, VoteStorm, LoginBurst, TokenChurn)
+}
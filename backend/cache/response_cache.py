@@ -0,0 +1,195 @@
+"""
+Redis-backed cache of rendered JSON responses with strong ETags.
+
+Entries are keyed by request path and query parameters and are grouped by tags
+(e.g. `feed`, `poll_<id>`), so writes can invalidate every response that may contain
+the changed data. Each entry also expires after a short TTL.
+
+With read replicas, a response built on a replica right after an invalidation may still
+contain the old data. Such responses are served but not cached while any of their tags
+was invalidated within `replica_lag` seconds, so stale data is not cached for a whole TTL.
+
+Usage:
+    1. Call `ResponseCache.configure` and open the connection with `await ResponseCache.connect()`.
+    2. Return `await ResponseCache.respond(request, tags, build)` from a route, where `build`
+       is a coroutine function producing the response data (`replica=True` when it reads a replica).
+    3. Call `await ResponseCache.invalidate(*tags)` after writes.
+"""
+import hashlib
+import json
+import logging
+import redis.asyncio as redis
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pools import redis_connection_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+
+    _ttl: int
+    _replica_lag_ms: int = 0
+    _redis_settings: Dict[str, Any]
+    _redis_conn: Optional[redis.Redis] = None
+
+    # Deletes all entries of a tag and the tag set itself in one round trip.
+    # KEYS: tag sets, then their invalidation markers. ARGV[1]: marker lifetime in ms (0 for none).
+    _INVALIDATE_SCRIPT = """
+        local tags = #KEYS / 2
+        for t = 1, tags do
+            local keys = redis.call('SMEMBERS', KEYS[t])
+            for i = 1, #keys, 500 do
+                redis.call('DEL', unpack(keys, i, math.min(i + 499, #keys)))
+            end
+            redis.call('DEL', KEYS[t])
+            if tonumber(ARGV[1]) > 0 then
+                redis.call('SET', KEYS[tags + t], 1, 'PX', ARGV[1])
+            end
+        end
+    """
+
+    # Stores an entry and adds it to its tag sets, unless one of the given invalidation markers exists.
+    # KEYS: entry, tag sets, then markers. ARGV: etag, body, ttl, number of tags.
+    _SET_SCRIPT = """
+        local tags = tonumber(ARGV[4])
+        for i = tags + 2, #KEYS do
+            if redis.call('EXISTS', KEYS[i]) == 1 then
+                return 0
+            end
+        end
+        redis.call('HSET', KEYS[1], 'etag', ARGV[1], 'body', ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        for i = 2, tags + 1 do
+            redis.call('SADD', KEYS[i], KEYS[1])
+            redis.call('EXPIRE', KEYS[i], ARGV[3])
+        end
+        return 1
+    """
+
+
+    @classmethod
+    def configure(cls,
+            ttl: int = 5,
+            redis_host: str = "localhost",
+            redis_port: int = 6379,
+            redis_pass: Optional[str] = None,
+            redis_db_index: int = 2,
+            redis_max_connections: Optional[int] = None,
+            redis_pool_timeout: Optional[float] = None,
+            replica_lag: float = 0.0,
+        ):
+        """
+        `ttl` is the lifetime of a cached response in seconds.
+        `replica_lag` is the time in seconds replicas may lag behind the primary, 0 without replicas.
+        """
+        cls._ttl = ttl
+        cls._replica_lag_ms = int(replica_lag * 1000)
+        cls._redis_settings = {
+            "host": redis_host,
+            "port": redis_port,
+            "password": redis_pass,
+            "db": redis_db_index,
+            "max_connections": redis_max_connections,
+            "pool_timeout": redis_pool_timeout,
+        }
+
+
+    @classmethod
+    async def connect(cls):
+        cls._redis_conn = redis.Redis(connection_pool=redis_connection_pool(**cls._redis_settings))
+        cls._invalidate_script = cls._redis_conn.register_script(cls._INVALIDATE_SCRIPT)
+        cls._set_script = cls._redis_conn.register_script(cls._SET_SCRIPT)
+
+
+    @classmethod
+    async def close(cls):
+        if cls._redis_conn is not None:
+            await cls._redis_conn.aclose(close_connection_pool=True)
+            cls._redis_conn = None
+
+
+    @classmethod
+    async def respond(cls, request: Request, tags: List[str], build: Callable[[], Awaitable[Any]], replica: bool = False) -> Response:
+        """
+        Serve the response from cache, or build, cache and serve it.
+        `replica=True` when `build` reads a replica, the response is then not cached within
+        `replica_lag` after an invalidation of its tags.
+        Answers `304 Not Modified` when `If-None-Match` matches the entry's ETag.
+        """
+        key = cls._key(request)
+        entry = await cls._get(key)
+        if entry is None:
+            entry = cls._render(await build())
+            await cls._set(key, tags, *entry, replica=replica)
+        etag, body = entry
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if cls._etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+    @classmethod
+    async def invalidate(cls, *tags: str):
+        if cls._redis_conn is None:
+            return
+        try:
+            await cls._invalidate_script(
+                keys=[f"response_tag_{tag}" for tag in tags] + [f"response_invalidated_{tag}" for tag in tags],
+                args=[cls._replica_lag_ms]
+            )
+        except redis.RedisError as e:
+            logger.error("<ResponseCache::invalidate> %s: %s tags=%s", type(e).__name__, e, tags)
+
+
+    @classmethod
+    def _key(cls, request: Request) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"response_{request.url.path}?{query}"
+
+
+    @classmethod
+    def _render(cls, data: Any) -> Tuple[str, bytes]:
+        body = json.dumps(jsonable_encoder(data), separators=(",", ":")).encode("utf-8")
+        return f'"{hashlib.sha256(body).hexdigest()}"', body
+
+
+    @classmethod
+    def _etag_matches(cls, if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+
+    @classmethod
+    async def _get(cls, key: str) -> Optional[Tuple[str, bytes]]:
+        if cls._redis_conn is None:
+            return None
+        try:
+            entry = await cls._redis_conn.hgetall(key)
+        except redis.RedisError as e:
+            logger.error("<ResponseCache::_get> %s: %s", type(e).__name__, e)
+            return None
+        if not entry:
+            return None
+        return entry[b"etag"].decode("utf-8"), entry[b"body"]
+
+
+    @classmethod
+    async def _set(cls, key: str, tags: List[str], etag: str, body: bytes, replica: bool = False):
+        if cls._redis_conn is None:
+            return
+        markers = [f"response_invalidated_{tag}" for tag in tags] if replica and cls._replica_lag_ms else []
+        try:
+            await cls._set_script(
+                keys=[key] + [f"response_tag_{tag}" for tag in tags] + markers,
+                args=[etag, body, cls._ttl, len(tags)]
+            )
+        except redis.RedisError as e:
+            logger.error("<ResponseCache::_set> %s: %s", type(e).__name__, e)
@@ -1,15 +1,76 @@
-from decouple import config
+from decouple import config, Csv
 
 DEBUG = config('debug', default=False, cast=bool)
 
+SERVER_HOST = config("server_host", default="0.0.0.0")
+SERVER_PORT = config("server_port", cast=int, default=8000)
+SERVER_WORKERS = config("server_workers", cast=int, default=1)
+
+WARMUP_TIMEOUT = config("warmup_timeout", cast=float, default=30.0)
+WARMUP_PATHS = config("warmup_paths", cast=Csv(), default="/polls/all")
+READINESS_CHECK_TIMEOUT = config("readiness_check_timeout", cast=float, default=1.0)
+
+DB_MAX_CONNECTIONS = config("db_max_connections", cast=int, default=15)
+DB_POOL_SIZE_RATIO = config("db_pool_size_ratio", cast=float, default=0.33)
+DB_POOL_TIMEOUT = config("db_pool_timeout", cast=float, default=30.0)
+DB_POOL_RECYCLE = config("db_pool_recycle", cast=int, default=1800)
+DB_CONNECT_TIMEOUT = config("db_connect_timeout", cast=float, default=10.0)
+
+DB_REPLICA_HOSTS = config("db_replica_hosts", cast=Csv(), default="")
+DB_REPLICA_SELECTION = config("db_replica_selection", default="round_robin")
+DB_REPLICA_RETRY_AFTER = config("db_replica_retry_after", cast=float, default=5.0)
+DB_READ_YOUR_WRITES_WINDOW = config("db_read_your_writes_window", cast=float, default=5.0)
+DB_READ_YOUR_WRITES_REDIS_INDEX = config("db_read_your_writes_redis_index", cast=int, default=3)
+
+LOG_LEVEL = config("log_level", default="INFO")
+LOG_LEVELS = config("log_levels", cast=Csv(), default="")
+LOG_FILE = config("log_file", default="server.log")
+LOG_ERROR_BURST = config("log_error_burst", cast=int, default=5)
+LOG_ERROR_WINDOW = config("log_error_window", cast=float, default=10.0)
+
 REDIS_HOST = config("redis_host", default="localhost")
 REDIS_PORT = config("redis_port", cast=int, default=6379)
 REDIS_PASS = config("redis_pass", default=None)
+REDIS_MAX_CONNECTIONS = config("redis_max_connections", cast=int, default=0)
+REDIS_POOL_TIMEOUT = config("redis_pool_timeout", cast=float, default=5.0)
 
 JWT_SECRET = config("jwt_secret")
 JWT_ALGORITHM = config("jwt_algorithm")
 JWT_ACCESS_EXP = config("jwt_access_token_time", cast=int)
 JWT_REFRESH_EXP = config("jwt_refresh_token_time", cast=int)
 JWT_REDIS_INDEX = config("jwt_redis_index", cast=int, default=0)
+JWT_REVOCATION_CACHE_SIZE = config("jwt_revocation_cache_size", cast=int, default=100000)
+JWT_REVOCATION_STALENESS = config("jwt_revocation_staleness", cast=float, default=5.0)
+
+ARGON2_TIME_COST = config("argon2_time_cost", cast=int, default=3)
+ARGON2_MEMORY_COST = config("argon2_memory_cost", cast=int, default=65536)
+ARGON2_PARALLELISM = config("argon2_parallelism", cast=int, default=4)
+PASSWORD_HASH_WORKERS = config("password_hash_workers", cast=int, default=0)
+PASSWORD_HASH_MAX_PENDING = config("password_hash_max_pending", cast=int, default=32)
 
+IDENTITY_CACHE_TTL = config("identity_cache_ttl", cast=float, default=30.0)
+IDENTITY_CACHE_SIZE = config("identity_cache_size", cast=int, default=10000)
+
+RATE_LIMITER_ENABLED = config("rate_limiter_enabled", cast=bool, default=True)
 RATE_LIMITER_REDIS_INDEX = config("rate_limiter_redis_index", cast=int, default=1)
+RATE_LIMITER_SYNC_INTERVAL = config("rate_limiter_sync_interval", cast=float, default=0.5)
+
+RESPONSE_CACHE_REDIS_INDEX = config("response_cache_redis_index", cast=int, default=2)
+RESPONSE_CACHE_TTL = config("response_cache_ttl", cast=int, default=5)
+RESPONSE_CACHE_INVALIDATE_ON_VOTE = config("response_cache_invalidate_on_vote", cast=bool, default=False)
+
+POLLS_PAGE_SIZE = config("polls_page_size", cast=int, default=20)
+POLLS_MAX_PAGE_SIZE = config("polls_max_page_size", cast=int, default=100)
+POLLS_IMPORT_BATCH_SIZE = config("polls_import_batch_size", cast=int, default=500)
+POLLS_IMPORT_MAX_POLLS = config("polls_import_max_polls", cast=int, default=10000)
+POLLS_IMPORT_MAX_LINE_BYTES = config("polls_import_max_line_bytes", cast=int, default=65536)
+MY_VOTES_MAX_IDS = config("my_votes_max_ids", cast=int, default=100)
+
+POLL_PURGE_CHUNK_SIZE = config("poll_purge_chunk_size", cast=int, default=5000)
+POLL_PURGE_INTERVAL = config("poll_purge_interval", cast=float, default=5.0)
+
+LIVE_UPDATES_MAX_RATE = config("live_updates_max_rate", cast=float, default=2.0)
+
+VOTE_BATCHING = config("vote_batching", cast=bool, default=False)
+VOTE_BATCH_SIZE = config("vote_batch_size", cast=int, default=500)
+VOTE_BATCH_INTERVAL_MS = config("vote_batch_interval_ms", cast=int, default=5)
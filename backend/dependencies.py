@@ -1,9 +1,30 @@
-from models.database import SessionLocal
+from fastapi import Depends
+from typing import Annotated
 
+from models.database import AsyncSessionLocal
+from models.replicas import ReplicaRouter
+from security.fastapi_jwt_redis import JwtBearer, AuthCredentials
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+# Shared by endpoints and `get_user_read_db`, so the token is verified once per request
+access_token = JwtBearer()
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    """Read-only session on a replica, or on the primary when no replica is healthy."""
+    async with ReplicaRouter.session() as db:
+        yield db
+
+
+async def get_user_read_db(credentials: Annotated[AuthCredentials, Depends(access_token)]):
+    """
+    Read-only session for an authenticated user, on the primary within the read-your-writes
+    window after the user's last write (see `ReplicaRouter.record_write`).
+    """
+    async with ReplicaRouter.session(primary=await ReplicaRouter.wrote_recently(credentials["user_id"])) as db:
         yield db
-    finally:
-        db.close()
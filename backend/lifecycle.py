@@ -0,0 +1,169 @@
+"""
+Startup warm-up and readiness of a worker.
+
+`Readiness.start` runs from the app lifespan, before the worker accepts connections. It opens
+the database pool connections and a connection of every Redis client, hashes one password
+(starting the Argon2 pool) and requests the warm-up `paths` in-process, which fills the
+response cache and SQLAlchemy's compiled statement cache. The first real request then finds
+everything open and cached. Warm-up requests are marked in the ASGI scope (`is_warmup`),
+they are not rate limited and not recorded in the request metrics.
+
+If a dependency is down, the warm-up is retried in the background with backoff instead of
+failing the startup. `/health/ready` reports the worker unavailable until the warm-up has
+finished and the database and Redis respond.
+"""
+import asyncio
+import logging
+import time
+import httpx
+
+from fastapi import FastAPI
+from starlette.types import Receive, Scope, Send
+from contextlib import AsyncExitStack
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Tuple
+
+from security import pass_util
+
+
+logger = logging.getLogger(__name__)
+
+_WARMUP_SCOPE_KEY = "pollwizard.warmup"
+
+
+def is_warmup(scope: Scope) -> bool:
+    return scope.get(_WARMUP_SCOPE_KEY, False)
+
+
+class Readiness:
+    """
+    Usage:
+    - Call `configure`, then `start` and `stop` from the app lifespan.
+    - `check` returns the status of the warm-up and of every dependency.
+    """
+
+    _engine: AsyncEngine
+    _db_connections: int
+    _redis_services: Tuple[Any, ...]
+    _paths: List[str]
+    _timeout: float
+    _check_timeout: float
+    _max_retry_interval: float = 30.0
+
+    _warm: bool = False
+    _task: Optional[asyncio.Task] = None
+
+
+    @classmethod
+    def configure(cls,
+            engine: AsyncEngine,
+            db_connections: int = 5,
+            redis_services: Iterable[Any] = (),
+            paths: Iterable[str] = (),
+            timeout: float = 30.0,
+            check_timeout: float = 1.0,
+        ):
+        """
+        `db_connections` is the number of database connections opened in advance (the pool size).
+        `redis_services` are the classes holding a Redis client in `_redis_conn`, connected before `start`.
+        `paths` are requested with GET during the warm-up.
+        `timeout` is the time in seconds the startup waits for the warm-up, it continues in
+        the background afterwards. `check_timeout` bounds every readiness check.
+        """
+        cls._engine = engine
+        cls._db_connections = db_connections
+        cls._redis_services = tuple(redis_services)
+        cls._paths = list(paths)
+        cls._timeout = timeout
+        cls._check_timeout = check_timeout
+
+
+    @classmethod
+    async def start(cls, app: FastAPI):
+        cls._warm = False
+        cls._task = asyncio.create_task(cls._run(app))
+        try:
+            await asyncio.wait_for(asyncio.shield(cls._task), cls._timeout)
+        except asyncio.TimeoutError:
+            logger.warning("<Readiness::start> Warm-up did not finish in %.1fs, continuing in the background", cls._timeout)
+
+
+    @classmethod
+    async def stop(cls):
+        cls._warm = False
+        if cls._task is not None:
+            cls._task.cancel()
+            try:
+                await cls._task
+            except asyncio.CancelledError:
+                pass
+            cls._task = None
+
+
+    @classmethod
+    async def check(cls) -> Dict[str, str]:
+        """`"ok"`, or the reason of the failure, for the warm-up, the database and every Redis client."""
+        checks = {"warmup": "ok" if cls._warm else "pending"}
+        checks["database"] = await cls._check(cls._ping_db())
+        for service in cls._redis_services:
+            checks[f"redis:{service.__name__}"] = await cls._check(service._redis_conn.ping())
+        return checks
+
+
+    @classmethod
+    async def _check(cls, check: Awaitable[Any]) -> str:
+        try:
+            await asyncio.wait_for(check, cls._check_timeout)
+        except asyncio.TimeoutError:
+            return "timeout"
+        except Exception as e:
+            return type(e).__name__
+        return "ok"
+
+
+    @classmethod
+    async def _ping_db(cls):
+        async with cls._engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+    @classmethod
+    async def _run(cls, app: FastAPI):
+        retry_interval = 0.5
+        while True:
+            started_at = time.perf_counter()
+            try:
+                await cls._warm_up(app)
+            except Exception as e:
+                logger.warning("<Readiness::_run> Warm-up failed (%s: %s), retrying in %.1fs", type(e).__name__, e, retry_interval)
+                await asyncio.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, cls._max_retry_interval)
+                continue
+            cls._warm = True
+            logger.info("<Readiness::_run> Warm-up finished in %.3fs", time.perf_counter() - started_at)
+            return
+
+
+    @classmethod
+    async def _warm_up(cls, app: FastAPI):
+        # All connections are held at once, so the pool has to open each of them
+        async with AsyncExitStack() as stack:
+            for _ in range(cls._db_connections):
+                conn = await stack.enter_async_context(cls._engine.connect())
+                await conn.execute(text("SELECT 1"))
+
+        for service in cls._redis_services:
+            await service._redis_conn.ping()
+
+        await pass_util.get_password_hash("warm-up")
+
+        async def warmup_app(scope: Scope, receive: Receive, send: Send):
+            await app({**scope, _WARMUP_SCOPE_KEY: True}, receive, send)
+
+        transport = httpx.ASGITransport(app=warmup_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+            for path in cls._paths:
+                response = await client.get(path)
+                if response.status_code >= 500:
+                    raise RuntimeError(f"GET {path} returned {response.status_code}")
@@ -0,0 +1,166 @@
+"""
+Live vote count updates with Redis pub/sub fan-out.
+
+Every worker aggregates the votes it records and publishes the per-option deltas on a
+Redis channel at most `max_rate` times per second. Every worker listens on that channel
+and forwards the deltas to its local subscribers (e.g. SSE connections), again coalesced
+to at most `max_rate` messages per second per connection, no matter the vote rate.
+
+Usage:
+    1. Call `PollUpdates.configure`, then `connect` and `close` from the app lifespan.
+    2. Call `PollUpdates.record_vote(poll_id, option_id)` for every accepted vote.
+    3. Iterate `PollUpdates.subscribe(poll_ids)` to receive `{poll_id: {option_id: delta}}` updates.
+"""
+import asyncio
+import json
+import logging
+import redis.asyncio as redis
+
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from pools import redis_connection_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Subscription:
+
+    def __init__(self, poll_ids: Set[int]):
+        self.poll_ids = poll_ids
+        self.pending: Dict[int, Counter] = {}
+        self.ready = asyncio.Event()
+
+
+class PollUpdates:
+
+    _max_rate: float
+    _keepalive: float
+    _redis_settings: Dict[str, Any]
+    _redis_conn: Optional[redis.Redis] = None
+    _channel: str = "poll_updates"
+
+    _outgoing: Dict[int, Counter] = {}
+    _subscriptions: Dict[int, Set[_Subscription]] = {}
+    _tasks: List[asyncio.Task] = []
+
+
+    @classmethod
+    def configure(cls,
+            max_rate: float = 2.0,
+            keepalive: float = 15.0,
+            redis_host: str = "localhost",
+            redis_port: int = 6379,
+            redis_pass: Optional[str] = None,
+            redis_max_connections: Optional[int] = None,
+            redis_pool_timeout: Optional[float] = None,
+        ):
+        """
+        `max_rate` is the maximum number of update messages per second per poll.
+        `keepalive` is the idle time (in seconds) after which subscribers get an empty update.
+        """
+        cls._max_rate = max_rate
+        cls._keepalive = keepalive
+        cls._redis_settings = {
+            "host": redis_host,
+            "port": redis_port,
+            "password": redis_pass,
+            "max_connections": redis_max_connections,
+            "pool_timeout": redis_pool_timeout,
+        }
+
+
+    @classmethod
+    async def connect(cls):
+        cls._redis_conn = redis.Redis(connection_pool=redis_connection_pool(**cls._redis_settings))
+        cls._tasks = [
+            asyncio.create_task(cls._publish_loop()),
+            asyncio.create_task(cls._listen_loop()),
+        ]
+
+
+    @classmethod
+    async def close(cls):
+        for task in cls._tasks:
+            task.cancel()
+        await asyncio.gather(*cls._tasks, return_exceptions=True)
+        cls._tasks = []
+        if cls._redis_conn is not None:
+            await cls._redis_conn.aclose(close_connection_pool=True)
+            cls._redis_conn = None
+
+
+    @classmethod
+    def record_vote(cls, poll_id: int, option_id: int):
+        """
+        Queue a vote for the next aggregated publish. Does not touch the network.
+        """
+        cls._outgoing.setdefault(poll_id, Counter())[option_id] += 1
+
+
+    @classmethod
+    async def subscribe(cls, poll_ids: Set[int]) -> AsyncIterator[Dict[int, Dict[int, int]]]:
+        """
+        Yield coalesced vote count deltas for the given polls until the consumer stops iterating.
+        An empty dict is yielded after `keepalive` seconds without updates.
+        """
+        subscription = _Subscription(poll_ids)
+        for poll_id in poll_ids:
+            cls._subscriptions.setdefault(poll_id, set()).add(subscription)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), cls._keepalive)
+                except asyncio.TimeoutError:
+                    yield {}
+                    continue
+                update, subscription.pending = subscription.pending, {}
+                subscription.ready.clear()
+                yield {poll_id: dict(deltas) for poll_id, deltas in update.items()}
+                await asyncio.sleep(1 / cls._max_rate)
+        finally:
+            for poll_id in poll_ids:
+                subscribers = cls._subscriptions.get(poll_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del cls._subscriptions[poll_id]
+
+
+    @classmethod
+    async def _publish_loop(cls):
+        while True:
+            await asyncio.sleep(1 / cls._max_rate)
+            if not cls._outgoing:
+                continue
+            outgoing, cls._outgoing = cls._outgoing, {}
+            message = json.dumps({poll_id: deltas for poll_id, deltas in outgoing.items()})
+            try:
+                await cls._redis_conn.publish(cls._channel, message)
+            except redis.RedisError as e:
+                logger.error("<PollUpdates::_publish_loop> %s: %s", type(e).__name__, e)
+
+
+    @classmethod
+    async def _listen_loop(cls):
+        while True:
+            try:
+                async with cls._redis_conn.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(cls._channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            cls._dispatch(json.loads(message["data"]))
+            except redis.RedisError as e:
+                logger.error("<PollUpdates::_listen_loop> %s: %s", type(e).__name__, e)
+                await asyncio.sleep(1)
+
+
+    @classmethod
+    def _dispatch(cls, update: Dict[str, Dict[str, int]]):
+        for poll_id, deltas in update.items():
+            for subscription in cls._subscriptions.get(int(poll_id), ()):
+                pending = subscription.pending.setdefault(int(poll_id), Counter())
+                for option_id, delta in deltas.items():
+                    pending[int(option_id)] += delta
+                subscription.ready.set()
@@ -0,0 +1,144 @@
+"""
+Non-blocking logging setup.
+
+Records are put on a queue by a `QueueHandler` on the root logger and written as JSON lines
+by a `QueueListener` thread, so the event loop never waits for console or file I/O.
+Repeated warnings and errors (same logger and message template) are throttled before they
+reach the queue: at most `burst` records per `window` seconds are let through, and the next
+record after a suppressed run carries a `suppressed` count.
+
+Usage:
+    `configure_logging(...)` once on startup, `stop_logging()` on shutdown (also run at exit).
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# Attributes every `LogRecord` has, anything else was passed with `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the text of a traceback is queued, traceback objects keep their frames alive.
+        # JSON encoding is left to the listener thread.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Let through at most `burst` records with the same logger, level and message template
+    per `window` seconds. Records below `level` are never throttled.
+    """
+
+    def __init__(self, burst: int = 5, window: float = 10.0, level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self._lock = threading.Lock()
+        # (logger, level, template) -> [window start, records let through, records suppressed]
+        self._seen: Dict[Tuple[str, int, str], list] = {}
+
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self._seen) > 10_000:
+                    self._seen.clear()
+                suppressed = state[2] if state is not None else 0
+                self._seen[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+def configure_logging(
+        level: str = "INFO",
+        levels: Iterable[str] = (),
+        file: Optional[str] = "server.log",
+        error_burst: int = 5,
+        error_window: float = 10.0,
+    ):
+    """
+    `level` is the root logger level, `levels` are per-logger overrides as `name=LEVEL` strings
+    (e.g. `security=WARNING`). Records are written to stderr and to `file` (if set).
+    """
+    global _listener
+    stop_logging()
+
+    handlers = [logging.StreamHandler()]
+    if file:
+        handlers.append(logging.FileHandler(file))
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RepeatFilter(burst=error_burst, window=error_window))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for override in levels:
+        name, _, logger_level = override.partition("=")
+        logging.getLogger(name.strip()).setLevel(logger_level.strip().upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
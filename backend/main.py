@@ -1,57 +1,160 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from contextlib import asynccontextmanager
-from routers import users, polls, dev
+from routers import users, polls, health, dev
 from fastapi.middleware.cors import CORSMiddleware
-import redis.asyncio as redis
-import logging
-
-from fastapi_limiter import FastAPILimiter
 
 from security.fastapi_jwt_redis import JwtManager
+from security.rate_limiter import TokenBucketLimiter
+from security import pass_util
 
-from models.database import engine
-from models.user import model as userModel
-from models.poll import model as pollModel
-from models.poll_options import model as pollOptionsModel
-from models.poll_votes import model as pollVotesModel
+from cache.response_cache import ResponseCache
+from live.poll_updates import PollUpdates
 
-from config import *
+from models.poll_votes.batcher import VoteBatcher
+from models.poll.purger import PollPurger
+from models.user.identity import IdentityCache
 
-userModel.Base.metadata.create_all(bind=engine)
-pollModel.Base.metadata.create_all(bind=engine)
-pollOptionsModel.Base.metadata.create_all(bind=engine)
-pollVotesModel.Base.metadata.create_all(bind=engine)
+from models.database import async_engine, AsyncSessionLocal, replica_engines, DB_POOL_SIZE
+from models.replicas import ReplicaRouter
+from lifecycle import Readiness
+from log_config import configure_logging, stop_logging
+from metrics.prometheus import MetricsMiddleware, instrument_engine, metrics_response, mark_process_dead
+from pools import redis_pool_limit
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="[%(levelname)s][%(asctime)s] %(message)s",
-    datefmt="%d-%m-%Y %H:%M:%S",
-    handlers=[logging.StreamHandler(), logging.FileHandler("server.log")],
-)
+from config import *
+
+# Pool size of each Redis client in this worker
+REDIS_POOL_SIZE = redis_pool_limit(REDIS_MAX_CONNECTIONS, SERVER_WORKERS)
 
 JwtManager.configure(
     secret=JWT_SECRET,
     redis_host=REDIS_HOST,
     redis_port=REDIS_PORT,
     redis_pass=REDIS_PASS,
-    redis_db_index=JWT_REDIS_INDEX
+    redis_max_connections=REDIS_POOL_SIZE,
+    redis_pool_timeout=REDIS_POOL_TIMEOUT,
+    redis_db_index=JWT_REDIS_INDEX,
+    revocation_cache_size=JWT_REVOCATION_CACHE_SIZE,
+    revocation_staleness=JWT_REVOCATION_STALENESS
+)
+
+TokenBucketLimiter.configure(
+    enabled=RATE_LIMITER_ENABLED,
+    sync_interval=RATE_LIMITER_SYNC_INTERVAL,
+    redis_host=REDIS_HOST,
+    redis_port=REDIS_PORT,
+    redis_pass=REDIS_PASS,
+    redis_max_connections=REDIS_POOL_SIZE,
+    redis_pool_timeout=REDIS_POOL_TIMEOUT,
+    redis_db_index=RATE_LIMITER_REDIS_INDEX
+)
+
+pass_util.configure(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+    workers=PASSWORD_HASH_WORKERS or None,
+    max_pending=PASSWORD_HASH_MAX_PENDING
+)
+
+IdentityCache.configure(
+    ttl=IDENTITY_CACHE_TTL,
+    max_size=IDENTITY_CACHE_SIZE
+)
+
+ResponseCache.configure(
+    ttl=RESPONSE_CACHE_TTL,
+    redis_host=REDIS_HOST,
+    redis_port=REDIS_PORT,
+    redis_pass=REDIS_PASS,
+    redis_max_connections=REDIS_POOL_SIZE,
+    redis_pool_timeout=REDIS_POOL_TIMEOUT,
+    redis_db_index=RESPONSE_CACHE_REDIS_INDEX,
+    # Replicas are expected to replay writes within the read-your-writes window
+    replica_lag=DB_READ_YOUR_WRITES_WINDOW if replica_engines else 0
+)
+
+PollUpdates.configure(
+    max_rate=LIVE_UPDATES_MAX_RATE,
+    redis_host=REDIS_HOST,
+    redis_port=REDIS_PORT,
+    redis_pass=REDIS_PASS,
+    redis_max_connections=REDIS_POOL_SIZE,
+    redis_pool_timeout=REDIS_POOL_TIMEOUT
+)
+
+VoteBatcher.configure(
+    batch_size=VOTE_BATCH_SIZE,
+    interval_ms=VOTE_BATCH_INTERVAL_MS
+)
+
+PollPurger.configure(
+    chunk_size=POLL_PURGE_CHUNK_SIZE,
+    interval=POLL_PURGE_INTERVAL
+)
+
+ReplicaRouter.configure(
+    primary=AsyncSessionLocal,
+    replicas=replica_engines,
+    selection=DB_REPLICA_SELECTION,
+    retry_after=DB_REPLICA_RETRY_AFTER,
+    read_your_writes_window=DB_READ_YOUR_WRITES_WINDOW,
+    redis_host=REDIS_HOST,
+    redis_port=REDIS_PORT,
+    redis_pass=REDIS_PASS,
+    redis_max_connections=REDIS_POOL_SIZE,
+    redis_pool_timeout=REDIS_POOL_TIMEOUT,
+    redis_db_index=DB_READ_YOUR_WRITES_REDIS_INDEX
+)
+
+Readiness.configure(
+    engine=async_engine,
+    db_connections=DB_POOL_SIZE,
+    redis_services=(JwtManager, TokenBucketLimiter, ResponseCache, PollUpdates, ReplicaRouter),
+    paths=WARMUP_PATHS,
+    timeout=WARMUP_TIMEOUT,
+    check_timeout=READINESS_CHECK_TIMEOUT
 )
 
+for engine in (async_engine, *replica_engines):
+    instrument_engine(engine.sync_engine)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis_url = f"redis://:{REDIS_PASS}@{REDIS_HOST}:{REDIS_PORT}/{RATE_LIMITER_REDIS_INDEX}"
-    redis_instance = redis.from_url(
-        redis_url,
-        encoding="utf-8",
-        decode_responses=True,
+    # The log file and writer thread belong to the serving process, importing the app does not open them
+    configure_logging(
+        level=LOG_LEVEL,
+        levels=LOG_LEVELS,
+        file=LOG_FILE,
+        error_burst=LOG_ERROR_BURST,
+        error_window=LOG_ERROR_WINDOW
     )
-    await FastAPILimiter.init(redis_instance)
+    await TokenBucketLimiter.connect()
+    await JwtManager.connect()
+    await ResponseCache.connect()
+    await PollUpdates.connect()
+    await ReplicaRouter.connect()
+    if VOTE_BATCHING:
+        await VoteBatcher.start()
+    await PollPurger.start()
+    await Readiness.start(app)
     yield 
-    await redis_instance.close()
+    await Readiness.stop()
+    await PollPurger.stop()
+    await VoteBatcher.stop()
+    await PollUpdates.close()
+    await ResponseCache.close()
+    await JwtManager.close()
+    await TokenBucketLimiter.close()
+    await ReplicaRouter.close()
+    await async_engine.dispose()
+    mark_process_dead()
+    stop_logging()
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(users.router)
 app.include_router(polls.router)
+app.include_router(health.router)
 if DEBUG:
     app.include_router(dev.router)
 
@@ -62,8 +165,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get('/', tags=["Home"])
 def greet():
     return {"message": "Backend aplikacji zespołu Ankieciarze"}
 
+@app.get('/metrics', include_in_schema=False)
+def metrics() -> Response:
+    return metrics_response()
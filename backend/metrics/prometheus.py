@@ -0,0 +1,178 @@
+"""
+Prometheus instrumentation.
+
+- `MetricsMiddleware` records per-route latency, in-flight requests and the number and total
+  duration of SQL statements issued while handling each request.
+- `instrument_engine` hooks SQLAlchemy engine events to time statements and pool checkouts.
+- `redis_timer` times Redis calls made by `JwtManager` and the rate limiter.
+- `metrics_response` renders all metrics for the `/metrics` endpoint. When the
+  `PROMETHEUS_MULTIPROC_DIR` environment variable is set, metrics of all workers are aggregated,
+  `mark_process_dead` drops the live gauges of a worker that shuts down.
+
+Routes are labelled by their path template, requests not matching any route share the
+`unmatched` label, so label cardinality stays bounded.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, \
+    generate_latest, REGISTRY
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from lifecycle import is_warmup
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled.", ["method", "route"],
+    multiprocess_mode="livesum"
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements issued per HTTP request.", ["method", "route"],
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100)
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds", "Total SQL statement time per HTTP request.", ["method", "route"]
+)
+SQL_DURATION = Histogram(
+    "sql_statement_duration_seconds", "SQL statement execution time.", ["operation"]
+)
+SQL_ERRORS = Counter(
+    "sql_statement_errors_total", "SQL statements that raised an error.", ["operation"]
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a database connection from the pool.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REDIS_DURATION = Histogram(
+    "redis_call_duration_seconds", "Redis call latency (a pipeline or script counts as one call).",
+    ["client", "operation"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+
+class _SqlStats:
+    __slots__ = ("statements", "duration")
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+
+
+# SQL statistics of the request being handled by the current task
+_request_sql: ContextVar[Optional[_SqlStats]] = ContextVar("request_sql", default=None)
+
+
+def redis_timer(client: str, operation: str):
+    """Context manager timing a Redis call, e.g. `with redis_timer("jwt", "revoke"): ...`."""
+    return REDIS_DURATION.labels(client, operation).time()
+
+
+def instrument_engine(engine: Engine):
+    """Time statements and pool checkouts of a (sync) engine, e.g. `async_engine.sync_engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started_at
+        SQL_DURATION.labels(_operation(statement)).observe(elapsed)
+        stats = _request_sql.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.duration += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        SQL_ERRORS.labels(_operation(exception_context.statement or "")).inc()
+
+    # The pool has no event before a checkout starts, so its `connect` is timed instead
+    pool = engine.pool
+    pool_connect = pool.connect
+
+    def timed_connect():
+        started_at = time.perf_counter()
+        try:
+            return pool_connect()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started_at)
+
+    pool.connect = timed_connect
+
+
+def _operation(statement: str) -> str:
+    operation = statement.lstrip()[:6].upper()
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def metrics_response() -> Response:
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request metrics. Implemented without `BaseHTTPMiddleware`,
+    so streamed responses (e.g. Server-Sent Events) are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or is_warmup(scope):
+            return await self.app(scope, receive, send)
+
+        method, route = scope["method"], self._route(scope)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = _SqlStats()
+        token = _request_sql.set(stats)
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started_at)
+            in_flight.dec()
+            REQUEST_SQL_STATEMENTS.labels(method, route).observe(stats.statements)
+            REQUEST_SQL_DURATION.labels(method, route).observe(stats.duration)
+            _request_sql.reset(token)
+
+
+    def _route(self, scope: Scope) -> str:
+        partial = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
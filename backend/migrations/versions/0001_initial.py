@@ -0,0 +1,52 @@
+"""Initial schema (as previously created by create_all)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False),
+        sa.Column("password", sa.String(100), nullable=False),
+    )
+    op.create_table(
+        "poll",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(200), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+    )
+    op.create_table(
+        "poll_options",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("value", sa.String(200), nullable=False),
+        sa.Column("poll_id", sa.Integer(), sa.ForeignKey("poll.id"), nullable=False),
+    )
+    op.create_table(
+        "poll_votes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("poll_option_id", sa.Integer(), sa.ForeignKey("poll_options.id"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("poll_votes")
+    op.drop_table("poll_options")
+    op.drop_table("poll")
+    op.drop_table("user")
@@ -0,0 +1,34 @@
+"""Denormalized vote counters on poll options and polls
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("poll_options", sa.Column("vote_count", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("poll", sa.Column("vote_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute(
+        "UPDATE poll_options SET vote_count = "
+        "(SELECT count(*) FROM poll_votes WHERE poll_votes.poll_option_id = poll_options.id)"
+    )
+    op.execute(
+        "UPDATE poll SET vote_count = "
+        "(SELECT coalesce(sum(vote_count), 0) FROM poll_options WHERE poll_options.poll_id = poll.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("poll", "vote_count")
+    op.drop_column("poll_options", "vote_count")
@@ -0,0 +1,63 @@
+"""Indexes on lookup columns and one vote per user and poll
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("poll_votes", sa.Column("poll_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE poll_votes SET poll_id = poll_options.poll_id "
+        "FROM poll_options WHERE poll_options.id = poll_votes.poll_option_id"
+    )
+    # The old check-then-insert could let duplicate votes through, keep the first one
+    op.execute(
+        "DELETE FROM poll_votes a USING poll_votes b "
+        "WHERE a.user_id = b.user_id AND a.poll_id = b.poll_id AND a.id > b.id"
+    )
+    op.alter_column("poll_votes", "poll_id", nullable=False)
+    op.create_foreign_key("poll_votes_poll_id_fkey", "poll_votes", "poll", ["poll_id"], ["id"])
+    op.create_unique_constraint("uq_poll_votes_user_id_poll_id", "poll_votes", ["user_id", "poll_id"])
+
+    op.create_index("ix_poll_votes_poll_id", "poll_votes", ["poll_id"])
+    op.create_index("ix_poll_votes_poll_option_id", "poll_votes", ["poll_option_id"])
+    op.create_index("ix_poll_options_poll_id", "poll_options", ["poll_id"])
+    op.create_index("ix_poll_created_at_id", "poll", ["created_at", "id"])
+    op.create_index("ix_poll_user_id_created_at_id", "poll", ["user_id", "created_at", "id"])
+    op.create_index("ix_user_email", "user", ["email"], unique=True)
+    op.create_index("ix_user_name", "user", ["name"], unique=True)
+
+    # Recount after removing duplicates
+    op.execute(
+        "UPDATE poll_options SET vote_count = "
+        "(SELECT count(*) FROM poll_votes WHERE poll_votes.poll_option_id = poll_options.id)"
+    )
+    op.execute(
+        "UPDATE poll SET vote_count = "
+        "(SELECT coalesce(sum(vote_count), 0) FROM poll_options WHERE poll_options.poll_id = poll.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_name", table_name="user")
+    op.drop_index("ix_user_email", table_name="user")
+    op.drop_index("ix_poll_user_id_created_at_id", table_name="poll")
+    op.drop_index("ix_poll_created_at_id", table_name="poll")
+    op.drop_index("ix_poll_options_poll_id", table_name="poll_options")
+    op.drop_index("ix_poll_votes_poll_option_id", table_name="poll_votes")
+    op.drop_index("ix_poll_votes_poll_id", table_name="poll_votes")
+    op.drop_constraint("uq_poll_votes_user_id_poll_id", "poll_votes", type_="unique")
+    op.drop_constraint("poll_votes_poll_id_fkey", "poll_votes", type_="foreignkey")
+    op.drop_column("poll_votes", "poll_id")
@@ -0,0 +1,40 @@
+"""Soft-deleted polls and cascading deletes of options and votes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CASCADES = [
+    ("poll_options_poll_id_fkey", "poll_options", "poll", "poll_id"),
+    ("poll_votes_poll_id_fkey", "poll_votes", "poll", "poll_id"),
+    ("poll_votes_poll_option_id_fkey", "poll_votes", "poll_options", "poll_option_id"),
+]
+
+
+def upgrade() -> None:
+    op.add_column("poll", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+    # The purger polls for deleted polls, only those are indexed
+    op.create_index("ix_poll_deleted_at", "poll", ["deleted_at"], postgresql_where=sa.text("deleted_at IS NOT NULL"))
+    for name, source, referent, column in CASCADES:
+        op.drop_constraint(name, source, type_="foreignkey")
+        op.create_foreign_key(name, source, referent, [column], ["id"], ondelete="CASCADE")
+
+
+def downgrade() -> None:
+    for name, source, referent, column in CASCADES:
+        op.drop_constraint(name, source, type_="foreignkey")
+        op.create_foreign_key(name, source, referent, [column], ["id"])
+    op.drop_index("ix_poll_deleted_at", table_name="poll")
+    op.drop_column("poll", "deleted_at")
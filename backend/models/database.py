@@ -1,11 +1,35 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from decouple import config
 
+from config import SERVER_WORKERS, DB_MAX_CONNECTIONS, DB_POOL_SIZE_RATIO, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, \
+    DB_CONNECT_TIMEOUT, DB_REPLICA_HOSTS
+from pools import db_pool_limits
+
 DATABASE_URL = f"postgresql://{config('db_user')}:{config('db_pass')}@{config('db_host')}:{config('db_port')}/{config('db_name')}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{config('db_user')}:{config('db_pass')}@{config('db_host')}:{config('db_port')}/{config('db_name')}"
+
+# Replicas (`host:port`) share the credentials and database name of the primary
+ASYNC_REPLICA_URLS = [
+    f"postgresql+asyncpg://{config('db_user')}:{config('db_pass')}@{host}/{config('db_name')}" for host in DB_REPLICA_HOSTS
+]
+
+# Every worker process gets its share of the server's connection budget, on the primary and on each replica
+DB_POOL_SIZE, DB_MAX_OVERFLOW = db_pool_limits(DB_MAX_CONNECTIONS, SERVER_WORKERS, DB_POOL_SIZE_RATIO)
+
+ENGINE_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "connect_args": {"timeout": DB_CONNECT_TIMEOUT},
+}
+
+# Schema is managed with Alembic (see `migrations/`), which connects through DATABASE_URL
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **ENGINE_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Read-only sessions are routed between these by `models.replicas.ReplicaRouter`
+replica_engines = [create_async_engine(url, **ENGINE_OPTIONS) for url in ASYNC_REPLICA_URLS]
 
 Base = declarative_base()
@@ -1,27 +1,104 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, func, tuple_
+from datetime import datetime
+from typing import List, Optional, Tuple
 import html
 
 from . import model, schema
 from ..poll_options import crud as optionsCrud
+from ..user.model import User
+from ..poll_votes.model import PollVotes
 
 
-def get_polls(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(model.Poll).order_by(model.Poll.created_at.desc()).offset(skip).limit(limit).all()
+async def get_poll(db: AsyncSession, poll_id: int):
+    return await db.scalar(select(model.Poll).where(model.Poll.id == poll_id).where(model.Poll.deleted_at.is_(None)))
 
 
-def get_poll(db: Session, poll_id: int):
-    return db.query(model.Poll).filter(model.Poll.id == poll_id).first()
+# Feed queries return (Poll, author name) rows, the author is resolved by a join
+# instead of a separate user lookup per poll.
+def _feed_query():
+    return (
+        select(model.Poll, User.name)
+        .join(User, User.id == model.Poll.user_id)
+        .where(model.Poll.deleted_at.is_(None))
+    )
 
 
-def create_poll(db: Session, poll: schema.PollCreate, userID: int):
-    db_poll = model.Poll(title=html.escape(poll.title, quote=True), user_id=userID)
-    db.add(db_poll)
-    db.commit()
-    db.refresh(db_poll)
-    return db_poll
+async def get_poll_feed(db: AsyncSession, poll_id: int):
+    result = await db.execute(_feed_query().where(model.Poll.id == poll_id))
+    return result.all()
 
 
-def delete_poll(db: Session, poll: model.Poll):
-    optionsCrud.delete_options(db, poll)
-    db.delete(poll)
-    db.commit()
+# Keyset pagination: `cursor` is the (created_at, id) of the last poll of the previous page.
+async def _paginate(db: AsyncSession, query, cursor: Optional[Tuple[datetime, int]], limit: int):
+    if cursor is not None:
+        query = query.where(tuple_(model.Poll.created_at, model.Poll.id) < tuple_(*cursor))
+    result = await db.execute(query.order_by(model.Poll.created_at.desc(), model.Poll.id.desc()).limit(limit))
+    return result.all()
+
+
+async def get_polls_feed(db: AsyncSession, cursor: Optional[Tuple[datetime, int]] = None, limit: int = 100):
+    return await _paginate(db, _feed_query(), cursor, limit)
+
+
+async def get_user_polls_feed(db: AsyncSession, username: str, cursor: Optional[Tuple[datetime, int]] = None, limit: int = 100):
+    return await _paginate(db, _feed_query().where(User.name == username), cursor, limit)
+
+
+async def create_poll(db: AsyncSession, poll: schema.PollCreate, userID: int) -> int:
+    return (await create_polls(db, [poll], userID))[0]
+
+
+async def create_polls(db: AsyncSession, polls: List[schema.PollCreate], userID: int) -> List[int]:
+    # Polls and all their options are inserted with multi-row INSERT ... RETURNING in one transaction
+    result = await db.scalars(
+        insert(model.Poll).returning(model.Poll.id, sort_by_parameter_order=True),
+        [{"title": html.escape(poll.title, quote=True), "user_id": userID} for poll in polls]
+    )
+    poll_ids = result.all()
+    await optionsCrud.add_options_to_polls(db, {poll_id: poll.options for poll_id, poll in zip(poll_ids, polls)})
+    await db.commit()
+    return poll_ids
+
+
+async def mark_poll_deleted(db: AsyncSession, poll: model.Poll):
+    await db.execute(update(model.Poll).where(model.Poll.id == poll.id).values(deleted_at=func.now()))
+    await db.commit()
+
+
+async def get_deleted_poll_ids(db: AsyncSession, limit: int = 100) -> List[int]:
+    result = await db.scalars(
+        select(model.Poll.id)
+        .where(model.Poll.deleted_at.is_not(None))
+        .order_by(model.Poll.deleted_at)
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def purge_poll_votes(db: AsyncSession, poll_id: int, chunk_size: int) -> Tuple[int, int]:
+    """
+    Delete up to `chunk_size` votes of a deleted poll in a short transaction.
+    Returns the number of votes deleted and the number of votes left.
+    """
+    chunk = (
+        select(PollVotes.id)
+        .where(PollVotes.poll_id == poll_id)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(delete(PollVotes).where(PollVotes.id.in_(chunk)))
+    remaining = await db.scalar(
+        update(model.Poll)
+        .where(model.Poll.id == poll_id)
+        .values(vote_count=func.greatest(model.Poll.vote_count - result.rowcount, 0))
+        .returning(model.Poll.vote_count)
+    )
+    await db.commit()
+    return result.rowcount, remaining or 0
+
+
+async def delete_poll(db: AsyncSession, poll_id: int):
+    # Options and any remaining votes are removed by ON DELETE CASCADE
+    await db.execute(delete(model.Poll).where(model.Poll.id == poll_id))
+    await db.commit()
@@ -1,10 +1,10 @@
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.sql import func
 from datetime import datetime
 from sqlalchemy.orm import relationship
-from typing import List
+from typing import List, Optional
 from sqlalchemy import String
 from ..database import Base
 from ..poll_options import model as pollOptionsModel
@@ -12,11 +12,22 @@ from ..poll_options import model as pollOptionsModel
 
 class Poll(Base):
     __tablename__ = "poll"
+    __table_args__ = (
+        # Keyset pagination of the global and per-user feeds
+        Index("ix_poll_created_at_id", "created_at", "id"),
+        Index("ix_poll_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Deleted polls waiting for the purger, live polls are not indexed
+        Index("ix_poll_deleted_at", "deleted_at",
+              postgresql_where=text("deleted_at IS NOT NULL"), sqlite_where=text("deleted_at IS NOT NULL")),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(200))
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
-    options: Mapped[List["pollOptionsModel.PollOptions"]] = relationship()
+    vote_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Set when the poll is deleted, its votes are then purged in the background
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(default=None)
+    options: Mapped[List["pollOptionsModel.PollOptions"]] = relationship(passive_deletes=True)
 
     def __repr__(self) -> str:
         return f"Poll(id={self.id!r}, title={self.title!r})"
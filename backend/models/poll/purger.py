@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Optional
+
+from . import crud
+from ..database import AsyncSessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+
+class PollPurger:
+    """
+    Background removal of deleted polls.
+
+    Polls are only marked as deleted by the API. This task deletes their votes in chunks
+    of `chunk_size` rows, each in its own short transaction, and then removes the poll
+    (its options go with it through ON DELETE CASCADE). Progress is logged per chunk.
+
+    Usage:
+    - Call `configure`, then `start` and `stop` from the app lifespan.
+    """
+
+    _chunk_size: int
+    _interval: float
+    _task: Optional[asyncio.Task] = None
+
+
+    @classmethod
+    def configure(cls, chunk_size: int = 5000, interval: float = 5.0):
+        cls._chunk_size = chunk_size
+        cls._interval = interval
+
+
+    @classmethod
+    async def start(cls):
+        cls._task = asyncio.create_task(cls._run())
+
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is None:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    poll_ids = await crud.get_deleted_poll_ids(db)
+                for poll_id in poll_ids:
+                    await cls._purge(poll_id)
+            except Exception as e:
+                logger.error("<PollPurger::_run> %s: %s", type(e).__name__, e)
+            await asyncio.sleep(cls._interval)
+
+
+    @classmethod
+    async def _purge(cls, poll_id: int):
+        purged = 0
+        async with AsyncSessionLocal() as db:
+            while True:
+                deleted, remaining = await crud.purge_poll_votes(db, poll_id, cls._chunk_size)
+                purged += deleted
+                if deleted:
+                    logger.info("<PollPurger::_purge> poll_id=%s purged=%s remaining=%s", poll_id, purged, remaining)
+                if deleted < cls._chunk_size:
+                    break
+                # Let request handlers run between chunks
+                await asyncio.sleep(0)
+            await crud.delete_poll(db, poll_id)
+        logger.info("<PollPurger::_purge> Poll deleted. poll_id=%s votes_purged=%s", poll_id, purged)
@@ -1,29 +1,30 @@
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert
+from typing import List, Dict
 import html
 
 from . import model
 
-from ..poll.model import Poll
-from ..poll_votes import crud as votesCrud
 
-
-def get_poll_options(db: Session, pollID: int, skip: int = 0, limit: int = 100):
-    return db.query(model.PollOptions).filter(model.PollOptions.poll_id==pollID).offset(skip).limit(limit).all()
-
-
-def get_poll_id(db: Session, optionID: int):
-    return db.query(model.PollOptions).filter(model.PollOptions.id==optionID).first().poll_id
-
-
-def add_options_to_poll(db: Session, options: List[str], pollID: int):
-    for option in options:
-        db_option = model.PollOptions(value=html.escape(option, quote=True), poll_id=pollID)
-        db.add(db_option)
-        db.commit()
-        db.refresh(db_option)
-
-
-def delete_options(db: Session, poll: Poll):
-    votesCrud.delete_votes(db, poll)
-    db.query(model.PollOptions).filter(model.PollOptions.poll_id==poll.id).delete()
+async def get_options_with_vote_counts(db: AsyncSession, pollIDs: List[int]):
+    if not pollIDs:
+        return []
+    result = await db.execute(
+        select(model.PollOptions.id, model.PollOptions.value, model.PollOptions.poll_id, model.PollOptions.vote_count)
+        .where(model.PollOptions.poll_id.in_(pollIDs))
+        .order_by(model.PollOptions.id)
+    )
+    return result.all()
+
+
+async def add_options_to_polls(db: AsyncSession, options: Dict[int, List[str]]) -> List[int]:
+    # Does not commit, options are written in the caller's transaction
+    result = await db.scalars(
+        insert(model.PollOptions).returning(model.PollOptions.id, sort_by_parameter_order=True),
+        [
+            {"value": html.escape(option, quote=True), "poll_id": poll_id}
+            for poll_id, poll_options in options.items()
+            for option in poll_options
+        ]
+    )
+    return result.all()
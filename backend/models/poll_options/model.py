@@ -12,8 +12,9 @@ class PollOptions(Base):
     __tablename__ = "poll_options"
     id: Mapped[int] = mapped_column(primary_key=True)
     value: Mapped[str] = mapped_column(String(200))
-    poll_id: Mapped[int] = mapped_column(ForeignKey("poll.id"))
-    votes: Mapped[List["pollVotesModel.PollVotes"]] = relationship()
+    poll_id: Mapped[int] = mapped_column(ForeignKey("poll.id", ondelete="CASCADE"), index=True)
+    vote_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    votes: Mapped[List["pollVotesModel.PollVotes"]] = relationship(passive_deletes=True)
 
     def __repr__(self) -> str:
         return f"Poll(id={self.id!r}, title={self.value!r})"
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from . import crud
+from ..database import AsyncSessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBatcher:
+    """
+    Group-commit vote ingestion.
+
+    Votes submitted by request handlers are queued and written by a single background task
+    in batches of up to `batch_size` votes, or whatever arrived within `interval` seconds
+    of the first queued vote. Each batch is one transaction with a multi-row INSERT.
+    Every caller still receives its own result (the inserted vote or `crud.VoteRejected`).
+
+    Usage:
+    - Call `configure`, then `start` and `stop` from the app lifespan.
+    - Submit votes with `await VoteBatcher.submit(user_id, option_id)`. While the batcher is
+      not running (before `start`, after `stop`), votes are inserted directly.
+    """
+
+    _batch_size: int
+    _interval: float
+    _max_pending: int
+    _queue: "asyncio.Queue[Optional[Tuple[int, int, asyncio.Future]]]"
+    _task: Optional[asyncio.Task] = None
+
+
+    @classmethod
+    def configure(cls, batch_size: int = 500, interval_ms: int = 5, max_pending: int = 10_000):
+        cls._batch_size = batch_size
+        cls._interval = interval_ms / 1000
+        cls._max_pending = max_pending
+
+
+    @classmethod
+    async def start(cls):
+        cls._queue = asyncio.Queue(maxsize=cls._max_pending)
+        cls._task = asyncio.create_task(cls._run())
+
+
+    @classmethod
+    async def stop(cls):
+        """
+        Flush the queued votes and stop the background task.
+        """
+        if cls._task is None:
+            return
+        task, cls._task = cls._task, None
+        await cls._queue.put(None)
+        await task
+        # Votes queued behind the stop marker
+        batch = []
+        while not cls._queue.empty():
+            item = cls._queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        if batch:
+            await cls._flush(batch)
+
+
+    @classmethod
+    async def submit(cls, userID: int, optionID: int) -> Dict[str, int]:
+        if cls._task is None:
+            async with AsyncSessionLocal() as db:
+                return await crud.vote_for_poll(db, userID, optionID)
+        future = asyncio.get_running_loop().create_future()
+        await cls._queue.put((userID, optionID, future))
+        return await future
+
+
+    @classmethod
+    async def _run(cls):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await cls._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + cls._interval
+            while len(batch) < cls._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(cls._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await cls._flush(batch)
+
+
+    @classmethod
+    async def _flush(cls, batch: List[Tuple[int, int, asyncio.Future]]):
+        try:
+            async with AsyncSessionLocal() as db:
+                results = await crud.insert_votes(db, [(user_id, option_id) for user_id, option_id, _ in batch])
+        except Exception as e:
+            logger.error("<VoteBatcher::_flush> %s: %s batch_size=%s", type(e).__name__, e, len(batch))
+            results = [e] * len(batch)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
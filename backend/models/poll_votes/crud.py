@@ -1,31 +1,163 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update, delete, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Dict, Tuple, Union
+from collections import Counter
 
 from . import model
-from ..poll_options import crud
+from ..poll_options.model import PollOptions
 
-from ..user.model import User
 from ..poll.model import Poll
 
 
-def vote_for_poll(db: Session, userID: int, optionID: int):
-    db_vote = model.PollVotes(poll_option_id=optionID, user_id=userID)
-    db.add(db_vote)
-    db.commit()
-    db.refresh(db_vote)
-    return db_vote
+class VoteRejected(Exception):
+    pass
 
 
-def get_user_vote(db: Session, userID: User, pollID: Poll):
-    poll_options = crud.get_poll_options(db, pollID)
-    user_vote = (
-        db.query(model.PollVotes)
-        .filter(model.PollVotes.user_id == userID)
-        .filter(model.PollVotes.poll_option_id.in_([option.id for option in poll_options]))
-        .first()
+async def vote_for_poll(db: AsyncSession, userID: int, optionID: int):
+    result = (await insert_votes(db, [(userID, optionID)]))[0]
+    if isinstance(result, VoteRejected):
+        raise result
+    return result
+
+
+async def insert_votes(db: AsyncSession, votes: List[Tuple[int, int]]) -> List[Union[Dict[str, int], VoteRejected]]:
+    """
+    Validate and insert a batch of `(user_id, option_id)` votes in a single transaction.
+    Returns, in input order, the inserted vote or a `VoteRejected` error for each entry.
+    """
+    option_polls = dict((await db.execute(
+        select(PollOptions.id, PollOptions.poll_id)
+        .join(Poll, Poll.id == PollOptions.poll_id)
+        .where(PollOptions.id.in_({option_id for _, option_id in votes}))
+        .where(Poll.deleted_at.is_(None))
+    )).all())
+
+    results, pending = [], {}
+    for user_id, option_id in votes:
+        poll_id = option_polls.get(option_id)
+        if poll_id is None:
+            results.append(VoteRejected("The selected poll option does not exist."))
+        elif (user_id, poll_id) in pending:
+            results.append(VoteRejected("You have already voted on this poll."))
+        else:
+            pending[(user_id, poll_id)] = len(results)
+            results.append({"user_id": user_id, "poll_id": poll_id, "poll_option_id": option_id})
+    if not pending:
+        return results
+
+    # Votes already stored for the same poll are skipped by the unique (user_id, poll_id) index
+    inserted = await db.execute(
+        pg_insert(model.PollVotes)
+        .values([results[i] for i in pending.values()])
+        .on_conflict_do_nothing(constraint="uq_poll_votes_user_id_poll_id")
+        .returning(model.PollVotes.id, model.PollVotes.user_id, model.PollVotes.poll_id)
+    )
+    accepted = []
+    for vote_id, user_id, poll_id in inserted.all():
+        i = pending.pop((user_id, poll_id))
+        results[i]["id"] = vote_id
+        accepted.append(i)
+    for i in pending.values():
+        results[i] = VoteRejected("You have already voted on this poll.")
+
+    if accepted:
+        # Counters are incremented in the same transaction as the vote inserts,
+        # in key order so concurrent batches lock rows in the same order
+        option_votes = Counter(results[i]["poll_option_id"] for i in accepted)
+        poll_votes = Counter(results[i]["poll_id"] for i in accepted)
+        options_table, polls_table = PollOptions.__table__, Poll.__table__
+        await db.execute(
+            update(options_table)
+            .where(options_table.c.id == bindparam("b_id"))
+            .values(vote_count=options_table.c.vote_count + bindparam("b_votes")),
+            [{"b_id": option_id, "b_votes": count} for option_id, count in sorted(option_votes.items())]
+        )
+        await db.execute(
+            update(polls_table)
+            .where(polls_table.c.id == bindparam("b_id"))
+            .values(vote_count=polls_table.c.vote_count + bindparam("b_votes")),
+            [{"b_id": poll_id, "b_votes": count} for poll_id, count in sorted(poll_votes.items())]
+        )
+    await db.commit()
+    return results
+
+
+async def get_user_votes(db: AsyncSession, userID: int, pollIDs: List[int]) -> Dict[int, int]:
+    result = await db.execute(
+        select(model.PollVotes.poll_id, model.PollVotes.poll_option_id)
+        .where(model.PollVotes.user_id == userID)
+        .where(model.PollVotes.poll_id.in_(pollIDs))
+    )
+    votes = {poll_id: -1 for poll_id in pollIDs}
+    votes.update(result.all())
+    return votes
+
+
+async def delete_user_votes(db: AsyncSession, userID: int):
+    # A user has at most one vote per poll, so every affected counter drops by one
+    await db.execute(
+        update(Poll)
+        .where(Poll.id.in_(select(model.PollVotes.poll_id).where(model.PollVotes.user_id == userID)))
+        .values(vote_count=Poll.vote_count - 1)
+    )
+    await db.execute(
+        update(PollOptions)
+        .where(PollOptions.id.in_(select(model.PollVotes.poll_option_id).where(model.PollVotes.user_id == userID)))
+        .values(vote_count=PollOptions.vote_count - 1)
+    )
+    await db.execute(delete(model.PollVotes).where(model.PollVotes.user_id == userID))
+
+
+def _counted_votes():
+    return (
+        select(model.PollVotes.poll_option_id, func.count().label("votes"))
+        .group_by(model.PollVotes.poll_option_id)
+        .subquery()
     )
-    return user_vote.poll_option_id if user_vote is not None else -1
 
 
-def delete_votes(db: Session, poll: Poll):
-    poll_options = crud.get_poll_options(db, poll.id)
-    db.query(model.PollVotes).filter(model.PollVotes.poll_option_id.in_([option.id for option in poll_options])).delete()
+async def get_vote_count_drift(db: AsyncSession):
+    """
+    Compare stored vote counters with the number of rows in `poll_votes`.
+    Returns `(options, polls)` lists of `(id, stored, actual)` rows that differ.
+    """
+    counted = _counted_votes()
+    actual = func.coalesce(counted.c.votes, 0)
+    options = await db.execute(
+        select(PollOptions.id, PollOptions.vote_count, actual)
+        .outerjoin(counted, counted.c.poll_option_id == PollOptions.id)
+        .where(PollOptions.vote_count != actual)
+        .order_by(PollOptions.id)
+    )
+    poll_actual = (
+        select(func.coalesce(func.sum(counted.c.votes), 0))
+        .select_from(PollOptions)
+        .join(counted, counted.c.poll_option_id == PollOptions.id)
+        .where(PollOptions.poll_id == Poll.id)
+        .scalar_subquery()
+    )
+    polls = await db.execute(
+        select(Poll.id, Poll.vote_count, poll_actual)
+        .where(Poll.vote_count != poll_actual)
+        .order_by(Poll.id)
+    )
+    return options.all(), polls.all()
+
+
+async def reconcile_vote_counts(db: AsyncSession):
+    await db.execute(
+        update(PollOptions).values(
+            vote_count=select(func.count(model.PollVotes.id))
+            .where(model.PollVotes.poll_option_id == PollOptions.id)
+            .scalar_subquery()
+        )
+    )
+    await db.execute(
+        update(Poll).values(
+            vote_count=select(func.coalesce(func.sum(PollOptions.vote_count), 0))
+            .where(PollOptions.poll_id == Poll.id)
+            .scalar_subquery()
+        )
+    )
+    await db.commit()
@@ -1,14 +1,19 @@
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, UniqueConstraint
 from ..database import Base
 
 
 class PollVotes(Base):
     __tablename__ = "poll_votes"
+    __table_args__ = (
+        # Also serves lookups by user_id alone
+        UniqueConstraint("user_id", "poll_id", name="uq_poll_votes_user_id_poll_id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
-    poll_option_id: Mapped[int] = mapped_column(ForeignKey("poll_options.id"))
+    poll_id: Mapped[int] = mapped_column(ForeignKey("poll.id", ondelete="CASCADE"), index=True)
+    poll_option_id: Mapped[int] = mapped_column(ForeignKey("poll_options.id", ondelete="CASCADE"), index=True)
 
     def __repr__(self) -> str:
         return f"Poll(id={self.id!r}, title={self.user_id!r})"
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+import redis.asyncio as redis
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from pools import redis_connection_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        self.in_use = 0
+        # Monotonic time after which a failed replica is probed again, None while healthy
+        self.retry_at: Optional[float] = None
+        self.probe: Optional[asyncio.Task] = None
+
+
+class ReplicaRouter:
+    """
+    Routing of read-only sessions to read replicas.
+
+    A replica is picked round-robin or by the fewest sessions in use (`least_connections`).
+    A replica whose connection fails is taken out of rotation, after `retry_after` seconds it is
+    probed in the background and rejoins once it answers. Reads go to the primary when no
+    replica is healthy or configured.
+
+    Read-your-writes: write endpoints call `record_write` with the user's id after a successful
+    write. For `read_your_writes_window` seconds afterwards, that user's reads go to the primary
+    (`wrote_recently`), so a voter does not read a replica that has not replayed the vote yet.
+    The window is kept in Redis, so it holds across worker processes.
+
+    Usage:
+    - Call `configure` and `await ReplicaRouter.connect()` on startup, `close` on shutdown.
+    - `session` opens a read-only session, see `dependencies.get_read_db` and `get_user_read_db`.
+    """
+
+    _primary: async_sessionmaker
+    _replicas: List[_Replica] = []
+    _selection: str = "round_robin"
+    _retry_after: float = 5.0
+    _read_your_writes_window: float = 5.0
+    _next: int = 0
+
+    _redis_settings: Dict[str, Any]
+    _redis_conn: Optional[redis.Redis] = None
+
+
+    @classmethod
+    def configure(cls,
+            primary: async_sessionmaker,
+            replicas: List[AsyncEngine] = (),
+            selection: str = "round_robin",
+            retry_after: float = 5.0,
+            read_your_writes_window: float = 5.0,
+            redis_host: str = "localhost",
+            redis_port: int = 6379,
+            redis_pass: Optional[str] = None,
+            redis_db_index: int = 3,
+            redis_max_connections: Optional[int] = None,
+            redis_pool_timeout: Optional[float] = None,
+        ):
+        """
+        `selection` is `round_robin` or `least_connections`.
+        `retry_after` is the time in seconds before a failed replica is probed again.
+        `read_your_writes_window` is the time in seconds a user's reads go to the primary after a write.
+        """
+        if selection not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica selection: {selection}. Use: round_robin, least_connections")
+        cls._primary = primary
+        cls._replicas = [_Replica(engine) for engine in replicas]
+        cls._selection = selection
+        cls._retry_after = retry_after
+        cls._read_your_writes_window = read_your_writes_window
+        cls._next = 0
+        cls._redis_settings = {
+            "host": redis_host,
+            "port": redis_port,
+            "password": redis_pass,
+            "db": redis_db_index,
+            "max_connections": redis_max_connections,
+            "pool_timeout": redis_pool_timeout,
+        }
+
+
+    @classmethod
+    async def connect(cls):
+        cls._redis_conn = redis.Redis(connection_pool=redis_connection_pool(**cls._redis_settings))
+
+
+    @classmethod
+    async def close(cls):
+        for replica in cls._replicas:
+            if replica.probe is not None:
+                replica.probe.cancel()
+            await replica.engine.dispose()
+        if cls._redis_conn is not None:
+            await cls._redis_conn.aclose(close_connection_pool=True)
+            cls._redis_conn = None
+
+
+    @classmethod
+    @asynccontextmanager
+    async def session(cls, primary: bool = False) -> AsyncIterator[AsyncSession]:
+        """
+        Session on a replica, or on the primary with `primary=True` or when no replica is healthy.
+        The replica connection is opened before the session is handed out, a replica that cannot
+        be reached is taken out of rotation and the next healthy replica (or the primary) is used.
+        """
+        replica = None if primary else cls._pick()
+        while replica is not None:
+            db = replica.sessionmaker()
+            try:
+                await db.connection()
+                break
+            except (OSError, asyncio.TimeoutError) as e:
+                await db.close()
+                cls._mark_failed(replica, e)
+            except DBAPIError as e:
+                await db.close()
+                if not e.connection_invalidated:
+                    raise
+                cls._mark_failed(replica, e)
+            replica = cls._pick()
+
+        if replica is None:
+            async with cls._primary() as db:
+                yield db
+            return
+
+        replica.in_use += 1
+        try:
+            async with db:
+                yield db
+        except (OSError, asyncio.TimeoutError) as e:
+            cls._mark_failed(replica, e)
+            raise
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                cls._mark_failed(replica, e)
+            raise
+        finally:
+            replica.in_use -= 1
+
+
+    @classmethod
+    async def record_write(cls, user_id: int):
+        """Send the reads of `user_id` to the primary for the read-your-writes window. Call after the write succeeded."""
+        if not cls._replicas or cls._redis_conn is None:
+            return
+        try:
+            await cls._redis_conn.set(cls._key(user_id), 1, px=int(cls._read_your_writes_window * 1000))
+        except redis.RedisError as e:
+            logger.error("<ReplicaRouter::record_write> %s: %s user_id=%s", type(e).__name__, e, user_id)
+
+
+    @classmethod
+    async def wrote_recently(cls, user_id: int) -> bool:
+        """Whether `user_id` wrote within the read-your-writes window. `True` when Redis is unavailable."""
+        if not cls._replicas:
+            return False
+        if cls._redis_conn is None:
+            return True
+        try:
+            return bool(await cls._redis_conn.exists(cls._key(user_id)))
+        except redis.RedisError as e:
+            logger.error("<ReplicaRouter::wrote_recently> %s: %s user_id=%s", type(e).__name__, e, user_id)
+            return True
+
+
+    @classmethod
+    def on_replica(cls, db: AsyncSession) -> bool:
+        """Whether `db` is a session on a replica."""
+        return any(db.bind is replica.sessionmaker.kw["bind"] for replica in cls._replicas)
+
+
+    @classmethod
+    def _key(cls, user_id: int) -> str:
+        return f"read_primary_{user_id}"
+
+
+    @classmethod
+    def _pick(cls) -> Optional[_Replica]:
+        now = time.monotonic()
+        healthy = []
+        for replica in cls._replicas:
+            if replica.retry_at is None:
+                healthy.append(replica)
+            elif now >= replica.retry_at and replica.probe is None:
+                replica.probe = asyncio.create_task(cls._probe(replica))
+        if not healthy:
+            return None
+
+        # Rotating the candidates spreads ties of least_connections too
+        cls._next = (cls._next + 1) % len(healthy)
+        candidates = healthy[cls._next:] + healthy[:cls._next]
+        if cls._selection == "least_connections":
+            return min(candidates, key=lambda replica: replica.in_use)
+        return candidates[0]
+
+
+    @classmethod
+    def _mark_failed(cls, replica: _Replica, error: Exception):
+        if replica.retry_at is None:
+            logger.warning("<ReplicaRouter::session> Replica %s failed (%s: %s), reading from other hosts",
+                           replica.engine.url.host, type(error).__name__, error)
+        replica.retry_at = time.monotonic() + cls._retry_after
+
+
+    @classmethod
+    async def _probe(cls, replica: _Replica):
+        try:
+            async with replica.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            replica.retry_at = time.monotonic() + cls._retry_after
+            logger.debug("<ReplicaRouter::_probe> Replica %s is still unavailable (%s)", replica.engine.url.host, type(e).__name__)
+        else:
+            replica.retry_at = None
+            logger.info("<ReplicaRouter::_probe> Replica %s is available again", replica.engine.url.host)
+        finally:
+            replica.probe = None
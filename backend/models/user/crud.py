@@ -1,37 +1,43 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
 from security.pass_util import get_password_hash
 
 from . import model, schema
+from .identity import IdentityCache
+from ..poll_votes import crud as votesCrud
 
 
-def get_user(db: Session, user_id: int):
-    return db.query(model.User).filter(model.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.scalar(select(model.User).where(model.User.id == user_id))
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(model.User).filter(model.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(model.User).where(model.User.email == email))
 
 
-def get_user_by_name(db: Session, name: str):
-    return db.query(model.User).filter(model.User.name == name).first()
+async def get_user_by_name(db: AsyncSession, name: str):
+    return await db.scalar(select(model.User).where(model.User.name == name))
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(model.User).offset(skip).limit(limit).all()
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.scalars(select(model.User).offset(skip).limit(limit))
+    return result.all()
 
 
-def create_user(db: Session, user: schema.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schema.UserCreate):
+    hashed_password = await get_password_hash(user.password)
     db_user = model.User(
         email=user.email, password=hashed_password, name=user.name)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def delete_user(db: Session, user_id: int):
-    toDelete = get_user(db, user_id)
-    db.delete(toDelete)
-    db.commit()
+async def delete_user(db: AsyncSession, user_id: int):
+    toDelete = await get_user(db, user_id)
+    await votesCrud.delete_user_votes(db, user_id)
+    await db.execute(delete(model.User).where(model.User.id == user_id))
+    await db.commit()
+    IdentityCache.invalidate(db, user_id)
     return toDelete
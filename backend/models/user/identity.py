@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from .model import User
+
+
+class UserIdentity(NamedTuple):
+    """Read-only projection of a user, without the password hash."""
+    id: int
+    name: str
+    email: str
+
+
+class IdentityCache:
+    """
+    Cache of user identities keyed by user ID.
+
+    Identities are kept for the lifetime of the database session (one request) in `db.info`
+    and in process memory for `ttl` seconds, bounded to `max_size` entries.
+    Entries must be invalidated when a user is deleted or their name or email changes.
+    Invalidation is local to the worker, other workers see the change once their entry expires.
+
+    Usage:
+    - Call `configure` on startup, then `get` to resolve identities.
+    """
+
+    _ttl: float = 30.0
+    _max_size: int = 10_000
+
+    # user_id -> (identity, UNIX time until which the entry is kept)
+    _entries: "OrderedDict[int, tuple[UserIdentity, float]]" = OrderedDict()
+
+
+    @classmethod
+    def configure(cls, ttl: float = 30.0, max_size: int = 10_000):
+        cls._ttl = ttl
+        cls._max_size = max_size
+        cls._entries.clear()
+
+
+    @classmethod
+    async def get(cls, db: AsyncSession, user_id: int) -> Optional[UserIdentity]:
+        request_identities = db.info.setdefault("user_identities", {})
+        identity = request_identities.get(user_id)
+        if identity is not None:
+            return identity
+
+        entry = cls._entries.get(user_id)
+        if entry is not None and entry[1] > time.time():
+            identity = entry[0]
+        else:
+            row = (await db.execute(
+                select(User.id, User.name, User.email).where(User.id == user_id)
+            )).first()
+            if row is None:
+                return None
+            identity = UserIdentity(*row)
+            cls._store(identity)
+
+        request_identities[user_id] = identity
+        return identity
+
+
+    @classmethod
+    def invalidate(cls, db: AsyncSession, user_id: int):
+        cls._entries.pop(user_id, None)
+        db.info.get("user_identities", {}).pop(user_id, None)
+
+
+    @classmethod
+    def _store(cls, identity: UserIdentity):
+        cls._entries[identity.id] = (identity, time.time() + cls._ttl)
+        cls._entries.move_to_end(identity.id)
+        while len(cls._entries) > cls._max_size:
+            cls._entries.popitem(last=False)
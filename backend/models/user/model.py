@@ -11,8 +11,8 @@ from ..poll_votes import model as pollVotesModel
 class User(Base):
     __tablename__ = "user"
     id: Mapped[int] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(String(100))
-    email: Mapped[str] = mapped_column(String(100))
+    name: Mapped[str] = mapped_column(String(100), unique=True, index=True)
+    email: Mapped[str] = mapped_column(String(100), unique=True, index=True)
     password: Mapped[str] = mapped_column(String(100))
     polls: Mapped[List["pollModel.Poll"]] = relationship()
     votes: Mapped[List["pollVotesModel.PollVotes"]] = relationship()
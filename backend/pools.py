@@ -0,0 +1,68 @@
+"""
+Connection pool sizing for running the app in several worker processes (see `server.py`).
+
+Database and Redis connection limits are configured as budgets for the whole server and
+divided between the `server_workers` processes, so adding workers does not exhaust the
+connections Postgres or Redis accept.
+"""
+import logging
+import redis.asyncio as redis
+
+from typing import Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Redis clients with their own pool in every worker:
+# JwtManager, TokenBucketLimiter, ResponseCache, PollUpdates and ReplicaRouter
+REDIS_CLIENTS = 5
+
+# Pub/sub listeners hold a connection of their pool, one more is needed for commands
+MIN_REDIS_POOL_SIZE = 2
+
+
+def worker_share(budget: int, workers: int) -> int:
+    """Connections of one worker from a `budget` shared by `workers` processes (at least 1)."""
+    if workers < 1:
+        raise ValueError("Number of workers must be at least 1.")
+    if budget < workers:
+        logger.warning("<worker_share> Connection budget %d is lower than the number of workers %d, using 1 per worker", budget, workers)
+    return max(1, budget // workers)
+
+
+def db_pool_limits(max_connections: int, workers: int, pool_size_ratio: float) -> Tuple[int, int]:
+    """
+    `(pool_size, max_overflow)` of the database pool of one worker.
+    `pool_size_ratio` of the worker's connections are kept open, the rest are overflow
+    connections that are closed when returned to the pool.
+    """
+    share = worker_share(max_connections, workers)
+    pool_size = min(share, max(1, round(share * pool_size_ratio)))
+    return pool_size, share - pool_size
+
+
+def redis_pool_limit(max_connections: int, workers: int, clients: int = REDIS_CLIENTS) -> Optional[int]:
+    """
+    Pool size of each of the `clients` Redis clients of one worker.
+    `None` (unbounded pools) when `max_connections` is 0. Raises `ValueError` when the budget
+    cannot give every client of every worker `MIN_REDIS_POOL_SIZE` connections.
+    """
+    if max_connections <= 0:
+        return None
+    minimum = workers * clients * MIN_REDIS_POOL_SIZE
+    if max_connections < minimum:
+        raise ValueError(
+            f"redis_max_connections must be at least {minimum} for {workers} workers "
+            f"({clients} Redis clients with {MIN_REDIS_POOL_SIZE} connections each), or 0 for unbounded pools."
+        )
+    return worker_share(max_connections, workers) // clients
+
+
+def redis_connection_pool(max_connections: Optional[int] = None, pool_timeout: Optional[float] = None, **settings) -> redis.ConnectionPool:
+    """
+    Unbounded Redis connection pool, or with `max_connections` a pool that waits up to `pool_timeout`
+    seconds for a free connection (forever with `None`) instead of failing when all are in use.
+    """
+    if max_connections is None:
+        return redis.ConnectionPool(**settings)
+    return redis.BlockingConnectionPool(max_connections=max_connections, timeout=pool_timeout, **settings)
@@ -0,0 +1,43 @@
+"""
+Recompute denormalized vote counters (`poll_options.vote_count`, `poll.vote_count`)
+from the `poll_votes` table and report any drift.
+
+Usage:
+    python reconcile_votes.py          # report drift only
+    python reconcile_votes.py --fix    # report drift and rewrite the counters
+"""
+import argparse
+import asyncio
+import sys
+
+from models.database import AsyncSessionLocal, async_engine
+from models.poll_votes import crud as voteCrud
+
+
+async def reconcile(fix: bool) -> bool:
+    async with AsyncSessionLocal() as db:
+        options, polls = await voteCrud.get_vote_count_drift(db)
+        for option_id, stored, actual in options:
+            print(f"poll_option {option_id}: stored={stored} actual={actual}")
+        for poll_id, stored, actual in polls:
+            print(f"poll {poll_id}: stored={stored} actual={actual}")
+        print(f"Drift found in {len(options)} option(s) and {len(polls)} poll(s).")
+
+        if fix and (options or polls):
+            await voteCrud.reconcile_vote_counts(db)
+            print("Counters reconciled.")
+    await async_engine.dispose()
+    return bool(options or polls)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reconcile poll vote counters.")
+    parser.add_argument("--fix", action="store_true", help="rewrite counters from poll_votes")
+    args = parser.parse_args()
+
+    drift = asyncio.run(reconcile(args.fix))
+    return 1 if drift and not args.fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
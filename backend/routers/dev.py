@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
 from dependencies import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import crud
 
 router = APIRouter(
@@ -11,15 +11,15 @@ router = APIRouter(
 
 
 @router.get("/users")
-async def get_users(db: Session = Depends(get_db)):
-    return crud.get_users(db)
+async def get_users(db: AsyncSession = Depends(get_db)):
+    return await crud.get_users(db)
 
 
 @router.get("/users/{userID}")
-async def get_user(userID: str, db: Session = Depends(get_db)):
-    return crud.get_user(db, userID)
+async def get_user(userID: int, db: AsyncSession = Depends(get_db)):
+    return await crud.get_user(db, userID)
 
 
 @router.delete("/users/{userID}")
-async def del_user(userID: str, db: Session = Depends(get_db)):
-    return crud.delete_user(db, userID)
+async def del_user(userID: int, db: AsyncSession = Depends(get_db)):
+    return await crud.delete_user(db, userID)
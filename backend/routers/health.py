@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Response
+from lifecycle import Readiness
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"],
+)
+
+
+@router.get("/live")
+async def live():
+    """The worker is running and its event loop responds."""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """The worker has warmed up and reaches the database and Redis, `503` otherwise."""
+    checks = await Readiness.check()
+    is_ready = all(status == "ok" for status in checks.values())
+    if not is_ready:
+        response.status_code = 503
+    return {"status": "ok" if is_ready else "unavailable", "checks": checks}
@@ -1,21 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
-from typing import Annotated, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from typing import Annotated, Optional
+from datetime import datetime
+import base64
+import json
+import binascii
 
-from dependencies import get_db
+from config import POLLS_PAGE_SIZE, POLLS_MAX_PAGE_SIZE, POLLS_IMPORT_BATCH_SIZE, POLLS_IMPORT_MAX_POLLS, \
+    POLLS_IMPORT_MAX_LINE_BYTES, MY_VOTES_MAX_IDS, VOTE_BATCHING, RESPONSE_CACHE_INVALIDATE_ON_VOTE
+from dependencies import get_db, get_read_db, get_user_read_db, access_token
+from security.rate_limiter import RateLimiter
 from security.fastapi_jwt_redis import JwtBearer, AuthCredentials
+from cache.response_cache import ResponseCache
+from live.poll_updates import PollUpdates
 
-from models.user import crud as userCrud
 from .users import get_user_identity
 
 from models.poll.model import Poll
 from models.poll import crud as pollCrud
 from models.poll import schema
 
-from models.poll_options.model import PollOptions
 from models.poll_options import crud as optionCrud
 from models.poll_votes import crud as voteCrud
+from models.poll_votes.batcher import VoteBatcher
+from models.replicas import ReplicaRouter
 
 
 router = APIRouter(
@@ -26,106 +36,253 @@ router = APIRouter(
 )
 
 
-def compose_polls_response(polls : list[Poll], db: Session):
+async def compose_polls_response(polls : list[tuple[Poll, str]], db: AsyncSession):
+    options = {poll.id: [] for poll, _ in polls}
+    for option_id, value, poll_id, votes in await optionCrud.get_options_with_vote_counts(db, list(options)):
+        options[poll_id].append({
+            "id": option_id,
+            "value": value,
+            "votes": votes
+        })
     return [{
         "id": poll.id,
         "title": poll.title,
         "created_at": poll.created_at,
-        "created_by": userCrud.get_user(db, poll.user_id).name,
-        "options": [{
-            "id": option.id,
-            "value": option.value,
-            "votes": len(option.votes)
-        } for option in poll.options ]
-    } for poll in polls ]
+        "created_by": author,
+        "votes": poll.vote_count,
+        "options": options[poll.id]
+    } for poll, author in polls ]
+
+
+def encode_cursor(poll: Poll) -> str:
+    raw = f"{poll.created_at.isoformat()}|{poll.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    try:
+        created_at, poll_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(poll_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+async def compose_polls_page(polls : list[tuple[Poll, str]], limit: int, db: AsyncSession):
+    # Pages are fetched with limit + 1 rows, an extra row means there is a next page
+    page = polls[:limit]
+    return {
+        "polls": await compose_polls_response(page, db),
+        "next_cursor": encode_cursor(page[-1][0]) if len(polls) > limit else None
+    }
+
+
+def parse_poll_ids(poll_ids: str) -> list[int]:
+    ids = list(dict.fromkeys(int(pid) for pid in poll_ids.split(",") if pid.strip().isdigit()))
+    if not ids:
+        raise HTTPException(400, "poll_ids must contain at least one valid ID")
+    if len(ids) > MY_VOTES_MAX_IDS:
+        raise HTTPException(400, f"poll_ids must not contain more than {MY_VOTES_MAX_IDS} IDs")
+    return ids
+
+
+PageSize = Annotated[int, Query(ge=1, le=POLLS_MAX_PAGE_SIZE)]
 
 
 @router.get("/")
 async def get_poll(
+    request: Request,
     poll_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    poll = pollCrud.get_poll(db, poll_id)
-    if poll is None:
-        raise HTTPException(status_code=404, detail="Poll not found.")
-    return compose_polls_response([poll], db)
+    async def build():
+        polls = await pollCrud.get_poll_feed(db, poll_id)
+        if not polls:
+            raise HTTPException(status_code=404, detail="Poll not found.")
+        return await compose_polls_response(polls, db)
+
+    return await ResponseCache.respond(request, [f"poll_{poll_id}"], build, replica=ReplicaRouter.on_replica(db))
 
 
 @router.get("/all")
 async def get_polls(
-    db: Session = Depends(get_db)
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: PageSize = POLLS_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    polls = pollCrud.get_polls(db)
-    return compose_polls_response(polls, db)
+    async def build():
+        polls = await pollCrud.get_polls_feed(db, decode_cursor(cursor), limit + 1)
+        return await compose_polls_page(polls, limit, db)
+
+    return await ResponseCache.respond(request, ["feed"], build, replica=ReplicaRouter.on_replica(db))
 
 
 @router.get("/user")
 async def get_user_polls(
+    request: Request,
     username: str,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: PageSize = POLLS_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    user = userCrud.get_user_by_name(db, username)
-    return compose_polls_response(user.polls, db)
+    async def build():
+        polls = await pollCrud.get_user_polls_feed(db, username, decode_cursor(cursor), limit + 1)
+        return await compose_polls_page(polls, limit, db)
+
+    return await ResponseCache.respond(request, ["feed"], build, replica=ReplicaRouter.on_replica(db))
 
 
 @router.post("/", status_code=201, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
 async def create_poll(
     credentials: Annotated[AuthCredentials, Depends(JwtBearer())],
     poll: schema.PollCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):   
-    user = get_user_identity(credentials, db)
-    created_poll = pollCrud.create_poll(db, poll, user.id)
-    optionCrud.add_options_to_poll(db, poll.options, created_poll.id)
-    return {"id": created_poll.id} 
+    user = await get_user_identity(credentials, db)
+    poll_id = await pollCrud.create_poll(db, poll, user.id)
+    await ReplicaRouter.record_write(user.id)
+    await ResponseCache.invalidate("feed")
+    return {"id": poll_id} 
+
+
+@router.post("/bulk", status_code=201, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def import_polls(
+    credentials: Annotated[AuthCredentials, Depends(JwtBearer())],
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Import polls from an NDJSON request body (one `PollCreate` document per line).
+    Valid polls are inserted in batches of `POLLS_IMPORT_BATCH_SIZE`, one transaction per batch.
+    Invalid lines are skipped and reported.
+    At most `POLLS_IMPORT_MAX_POLLS` non-empty lines of up to `POLLS_IMPORT_MAX_LINE_BYTES` bytes
+    are accepted, the import stops with `413` at the first line over a limit (earlier batches stay imported).
+    """
+    user = await get_user_identity(credentials, db)
+    created, errors, batch = [], [], []
+    line_number = polls = 0
+
+    async def reject(detail: str):
+        if created:
+            await ReplicaRouter.record_write(user.id)
+            await ResponseCache.invalidate("feed")
+        raise HTTPException(status_code=413, detail={"message": detail, "created": len(created), "ids": created})
+
+    async def parse_lines(lines: list[bytes]):
+        nonlocal line_number, polls
+        for line in lines:
+            line_number += 1
+            if len(line) > POLLS_IMPORT_MAX_LINE_BYTES:
+                await reject(f"Line {line_number} is longer than {POLLS_IMPORT_MAX_LINE_BYTES} bytes.")
+            if not line.strip():
+                continue
+            polls += 1
+            if polls > POLLS_IMPORT_MAX_POLLS:
+                await reject(f"At most {POLLS_IMPORT_MAX_POLLS} polls can be imported per request.")
+            try:
+                batch.append(schema.PollCreate.model_validate_json(line))
+            except ValidationError as e:
+                errors.append({"line": line_number, "detail": e.errors(include_url=False, include_context=False)})
+            if len(batch) >= POLLS_IMPORT_BATCH_SIZE:
+                created.extend(await pollCrud.create_polls(db, batch, user.id))
+                batch.clear()
+
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer += chunk
+        end = buffer.rfind(b"\n")
+        if end >= 0:
+            await parse_lines(bytes(buffer[:end]).split(b"\n"))
+            del buffer[:end + 1]
+        if len(buffer) > POLLS_IMPORT_MAX_LINE_BYTES:
+            await parse_lines([bytes(buffer)])
+    await parse_lines([bytes(buffer)])
+    if batch:
+        created.extend(await pollCrud.create_polls(db, batch, user.id))
+    if created:
+        await ReplicaRouter.record_write(user.id)
+        await ResponseCache.invalidate("feed")
+
+    return {"created": len(created), "ids": created, "errors": errors}
  
 
 @router.post("/vote", status_code=201)
 async def vote_for_poll(
     credentials: Annotated[AuthCredentials, Depends(JwtBearer())],
     option_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_user_identity(credentials, db)
-    if not db.query(PollOptions).filter(PollOptions.id==option_id).count():
-        raise HTTPException(status_code=422, detail="The selected poll option does not exist.")
+    user = await get_user_identity(credentials, db)
+    try:
+        if VOTE_BATCHING:
+            vote = await VoteBatcher.submit(user.id, option_id)
+        else:
+            vote = await voteCrud.vote_for_poll(db, user.id, option_id)
+    except voteCrud.VoteRejected as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    poll = pollCrud.get_poll(db, optionCrud.get_poll_id(db, option_id))
-    if voteCrud.get_user_vote(db, user.id, poll.id) != -1:
-        raise HTTPException(status_code=422, detail="You have already voted on this poll.")
-    
-    return voteCrud.vote_for_poll(db, user.id, option_id)
+    await ReplicaRouter.record_write(user.id)
+    PollUpdates.record_vote(vote["poll_id"], vote["poll_option_id"])
+
+    # By default cached vote counts are refreshed when entries expire, invalidating the feed on
+    # every vote would keep it uncached during a vote storm (live counts come from /polls/live)
+    if RESPONSE_CACHE_INVALIDATE_ON_VOTE:
+        await ResponseCache.invalidate("feed", f"poll_{vote['poll_id']}")
+    return vote
 
 
 @router.get("/my-votes")
 async def get_user_vote(
-    credentials: Annotated[AuthCredentials, Depends(JwtBearer())],
+    credentials: Annotated[AuthCredentials, Depends(access_token)],
     poll_ids: str = Query(..., min_length=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_user_read_db),
 ):
-    user = get_user_identity(credentials, db)
+    user = await get_user_identity(credentials, db)
 
-    ids = [int(pid) for pid in poll_ids.split(",") if pid.strip().isdigit()]
-    if not ids:
-        raise HTTPException(400, "poll_ids must contain at least one valid ID")
+    ids = parse_poll_ids(poll_ids)
+    return await voteCrud.get_user_votes(db, user.id, ids)
 
-    return {
-        poll_id: voteCrud.get_user_vote(db, user.id, poll_id)
-        for poll_id in ids
-    }
 
+@router.get("/live")
+async def get_live_votes(poll_ids: str = Query(..., min_length=1)):
+    """
+    Server-Sent Events stream of vote count deltas for the given polls.
+    Each `votes` event carries `{poll_id: {option_id: delta}}`.
+    """
+    ids = set(parse_poll_ids(poll_ids))
+
+    async def events():
+        async for update in PollUpdates.subscribe(ids):
+            if update:
+                yield f"event: votes\ndata: {json.dumps(update)}\n\n"
+            else:
+                yield ": keepalive\n\n"
 
-@router.delete("/")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/", status_code=202)
 async def delete_poll(
     credentials: Annotated[AuthCredentials, Depends(JwtBearer())],
     poll_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_user_identity(credentials, db)
-    poll = pollCrud.get_poll(db, poll_id)
+    user = await get_user_identity(credentials, db)
+    poll = await pollCrud.get_poll(db, poll_id)
     
+    if poll is None:
+        raise HTTPException(status_code=404, detail="Poll not found.")
+
     if user.id != poll.user_id:
         raise HTTPException(status_code=403, detail="You are not the author of this poll.")
     
-    pollCrud.delete_poll(db, poll)
+    await pollCrud.mark_poll_deleted(db, poll)
+    await ReplicaRouter.record_write(user.id)
+    await ResponseCache.invalidate("feed", f"poll_{poll_id}")
     return {"detail": "The poll has been deleted."}
@@ -9,20 +9,25 @@ Main features:
     2. Token revocation (invalidation).
     3. Refresh token misuse detection (can be used only once).
     4. `JwtBearer` class to handle authentication in FastAPI routes.
+    5. In-process cache of revoked tokens, so valid tokens are accepted without a Redis round trip.
 
 The role of Redis is to store:
-    1. Links between access and refresh tokens (for better token revocation).
+    1. Links between access and refresh tokens (for better token revocation), as sets.
     2. Refresh token uses (for misuse detection).
     3. Token blacklist (revoked tokens identifiers).
+    4. Revocation log and pub/sub channel that keep the in-process caches of all workers in sync.
 
 Usage:
     1. Initialize `JwtManager` by calling `configure` class method.
-    2. Generate token pairs for users.
-    3. Authenticate API calls using the custom `JwtBearer` class.
-    4. Handle token refresh and revocation in API endpoints.
+    2. Open the Redis connection pool with `await JwtManager.connect()` (e.g. in the app lifespan).
+    3. Generate token pairs for users.
+    4. Authenticate API calls using the custom `JwtBearer` class.
+    5. Handle token refresh and revocation in API endpoints.
+    6. Close the pool with `await JwtManager.close()` on shutdown.
 """
 import jwt
-import redis
+import redis.asyncio as redis
+import asyncio
 import time
 import uuid
 import logging
@@ -31,9 +36,16 @@ from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError, DecodeError
 from jwt.algorithms import get_default_algorithms
-from redis.client import Pipeline
+from redis.asyncio.client import Pipeline
 from typing import Optional, Literal, Union, Tuple, List, Dict, Any
 from enum import IntEnum
+from collections import OrderedDict
+
+from metrics.prometheus import redis_timer
+from pools import redis_connection_pool
+
+
+logger = logging.getLogger(__name__)
 
 
 class TokenType(IntEnum):
@@ -79,9 +91,11 @@ class JwtManager:
     Utility class for managing JSON Web Tokens (JWT).
     
     Usage:
-    - The class must be initialized using `configure` function.
+    - The class must be initialized using `configure` function and connected with `connect`.
     - Tokens can be generated with `generate_token_pair` and refreshed using `refresh_token_pair`.
     - Use `revoke_token` to invalidate token when user logs out.
+    - Requires a single Redis instance, not Redis Cluster: revocation follows the token links
+      server-side, so the keys it touches are only known while the script runs.
     """
 
     _secret: str
@@ -91,6 +105,83 @@ class JwtManager:
     _cache_exp: int
     _redis_conn: redis.Redis
     _redis_conn_pool: redis.ConnectionPool
+    _redis_settings: Dict[str, Any]
+
+    # Local revocation cache (jti -> UNIX time until which the entry is kept)
+    _revoked_cache: "OrderedDict[str, float]" = OrderedDict()
+    _revoked_cache_size: int
+    _revoked_cache_incomplete_until: float = 0.0
+    _revocation_staleness: float
+    _revocation_synced_at: float = float("-inf")
+    _revocation_listener: Optional[asyncio.Task] = None
+    _revocation_channel: str = "revocation_channel"
+    _revocation_log: str = "revocation_log"
+
+    # Walks the token link graph (`link_<jti>` sets) from the revoked token, blacklists every
+    # reachable token, records them in the revocation log and publishes them, all server-side.
+    # The `blacklist_<jti>` and `link_<jti>` keys of the linked tokens are found during the walk and
+    # cannot be declared in KEYS, which is why a single Redis instance is required.
+    # KEYS: revocation log. ARGV: jti, blacklist TTL, current UNIX time, revocation channel.
+    _REVOKE_SCRIPT = """
+        local ttl, now = tonumber(ARGV[2]), tonumber(ARGV[3])
+        local queue, seen, i = {ARGV[1]}, {[ARGV[1]] = true}, 1
+        while i <= #queue do
+            local jti = queue[i]
+            i = i + 1
+            redis.call('SETEX', 'blacklist_' .. jti, ttl, 1)
+            redis.call('ZADD', KEYS[1], now, jti)
+            local key = 'link_' .. jti
+            local links
+            if redis.call('TYPE', key).ok == 'string' then
+                -- Links written before they were stored as sets
+                links = {}
+                for linked in string.gmatch(redis.call('GET', key), '[^;]+') do
+                    links[#links + 1] = linked
+                end
+            else
+                links = redis.call('SMEMBERS', key)
+            end
+            for _, linked in ipairs(links) do
+                if not seen[linked] then
+                    seen[linked] = true
+                    queue[#queue + 1] = linked
+                end
+            end
+        end
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+        redis.call('PUBLISH', ARGV[4], table.concat(queue, ';'))
+        return queue
+    """
+
+    # Marks the refresh token as used and links it with the new token pair, all in one atomic step.
+    # Returns 0 without writing anything if the refresh token has been used already.
+    # KEYS: `refresh_<used jti>`, `link_<used jti>`, `link_<new access jti>`, `link_<new refresh jti>`.
+    # ARGV: used refresh jti, new access jti, new refresh jti, TTL.
+    _ROTATE_SCRIPT = """
+        local old, access, refresh, ttl = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+        local old_key, access_key, refresh_key = KEYS[2], KEYS[3], KEYS[4]
+        if not redis.call('SET', KEYS[1], 1, 'NX', 'EX', ttl) then
+            return 0
+        end
+        if redis.call('TYPE', old_key).ok == 'string' then
+            -- Links written before they were stored as sets
+            local links = {}
+            for linked in string.gmatch(redis.call('GET', old_key), '[^;]+') do
+                links[#links + 1] = linked
+            end
+            redis.call('DEL', old_key)
+            if #links > 0 then
+                redis.call('SADD', old_key, unpack(links))
+            end
+        end
+        redis.call('SADD', access_key, refresh, old)
+        redis.call('SADD', refresh_key, access, old)
+        redis.call('SADD', old_key, access, refresh)
+        redis.call('EXPIRE', access_key, ttl)
+        redis.call('EXPIRE', refresh_key, ttl)
+        redis.call('EXPIRE', old_key, ttl)
+        return 1
+    """
 
 
     @classmethod
@@ -103,10 +194,19 @@ class JwtManager:
             redis_port: int = 6379,
             redis_pass: Optional[str] = None,
             redis_db_index: int = 0,
+            redis_max_connections: Optional[int] = None,
+            redis_pool_timeout: Optional[float] = None,
+            revocation_cache_size: int = 100_000,
+            revocation_staleness: float = 5.0,
         ):
         """
         Required parameter: `secret` key for signing JWTs.
         The unit of token expiration time is seconds.
+        The Redis connection pool is created later by `connect`.
+
+        `revocation_cache_size` bounds the number of revoked JTIs kept in process memory.
+        `revocation_staleness` is the maximum time (in seconds) the local revocation cache may go
+        without confirmation from Redis before `JwtBearer` falls back to querying the blacklist.
         """
         # Check if algorithm is supported
         jwt_algorithms = list(get_default_algorithms().keys())
@@ -118,18 +218,68 @@ class JwtManager:
         cls._algorithm = algorithm
         cls._secret = secret
 
-        cls._redis_conn_pool = redis.ConnectionPool(
-            host=redis_host,
-            port=redis_port,
-            password=redis_pass,
-            db=redis_db_index
-        )
-        cls._redis_conn = redis.Redis(connection_pool=cls._redis_conn_pool)
+        cls._redis_settings = {
+            "host": redis_host,
+            "port": redis_port,
+            "password": redis_pass,
+            "db": redis_db_index,
+            "max_connections": redis_max_connections,
+            "pool_timeout": redis_pool_timeout,
+        }
         cls._cache_exp = refresh_expiration
+        cls._revoked_cache_size = revocation_cache_size
+        cls._revocation_staleness = revocation_staleness
+
+
+    @classmethod
+    async def connect(cls):
+        """
+        Open the Redis connection pool and start listening for token revocations.
+        Must be called from a running event loop.
+        """
+        cls._redis_conn_pool = redis_connection_pool(**cls._redis_settings)
+        cls._redis_conn = redis.Redis(connection_pool=cls._redis_conn_pool)
+        await cls._redis_conn.ping()
+        cls._redis_revoke_script = cls._redis_conn.register_script(cls._REVOKE_SCRIPT)
+        cls._redis_rotate_script = cls._redis_conn.register_script(cls._ROTATE_SCRIPT)
+        cls._revocation_listener = asyncio.create_task(cls._listen_for_revocations())
+
+
+    @classmethod
+    async def close(cls):
+        """
+        Stop the revocation listener, close the Redis client and disconnect all pooled connections.
+        """
+        if cls._revocation_listener is not None:
+            # `asyncio.wait_for` (Python < 3.12) may swallow a cancellation that races with
+            # an incoming message, so keep cancelling until the listener has stopped
+            while not cls._revocation_listener.done():
+                cls._revocation_listener.cancel()
+                await asyncio.wait([cls._revocation_listener], timeout=1)
+            cls._revocation_listener = None
+        cls._revocation_synced_at = float("-inf")
+        await cls._redis_conn.aclose()
+        await cls._redis_conn_pool.aclose()
+
+
+    @classmethod
+    async def is_token_revoked(cls, jti: str) -> bool:
+        """
+        Check whether the token has been revoked.
+
+        Answered from the in-process cache while it is in sync with Redis,
+        otherwise from the Redis blacklist.
+        """
+        expires_at = cls._revoked_cache.get(jti)
+        if expires_at is not None and expires_at > time.time():
+            return True
+        if cls._revocation_cache_is_fresh():
+            return False
+        return await cls._redis_check_blacklist(jti)
 
 
     @classmethod
-    def generate_token_pair(cls, subject: Dict[str, Union[str, int, float]]) -> Dict[Literal["access", "refresh"], str]:
+    async def generate_token_pair(cls, subject: Dict[str, Union[str, int, float]]) -> Dict[Literal["access", "refresh"], str]:
         """
         Generate a pair of JWT tokens (access & refresh) for the specified subject.
         
@@ -141,14 +291,17 @@ class JwtManager:
         access_token, access_jti = cls._encode_token(TokenType.ACCESS, subject)
         refresh_token, refresh_jti = cls._encode_token(TokenType.REFRESH, subject)
 
-        cls._redis_create_token_link(access_jti, refresh_jti)
-        cls._redis_create_token_link(refresh_jti, access_jti)
+        async with cls._redis_conn.pipeline() as redis_pipeline:
+            cls._redis_add_token_link(redis_pipeline, access_jti, refresh_jti)
+            cls._redis_add_token_link(redis_pipeline, refresh_jti, access_jti)
+            with redis_timer("jwt", "link_tokens"):
+                await redis_pipeline.execute()
 
         return {"access": access_token, "refresh": refresh_token}
 
 
     @classmethod
-    def refresh_token_pair(cls, credentials: AuthCredentials) -> Dict[Literal["access", "refresh"], str]:
+    async def refresh_token_pair(cls, credentials: AuthCredentials) -> Dict[Literal["access", "refresh"], str]:
         """
         Generate a new token pair using the provided refresh token.
         
@@ -161,95 +314,118 @@ class JwtManager:
 
         refresh_jti, subject = credentials.jti, credentials.subject
 
-        # Check if refresh token has been used already
-        if cls._redis_check_refresh_token_reuse(refresh_jti):
-            logging.error(f"<JwtManger::refresh_token_pair> Refresh Token Reuse Error! {subject=}")
-            cls.revoke_token(credentials)
-            raise HTTPException(status_code=401, detail="Invalid bearer token.")
-
-        cls._redis_mark_refresh_token(refresh_jti)
-
         # Generate new tokens
         new_access_token, new_access_jti = cls._encode_token(TokenType.ACCESS, subject)
         new_refresh_token, new_refresh_jti = cls._encode_token(TokenType.REFRESH, subject)
 
-        cls._redis_create_token_link(new_access_jti, new_refresh_jti, refresh_jti)
-        cls._redis_create_token_link(new_refresh_jti, new_access_jti, refresh_jti)
-        cls._redis_add_token_link(refresh_jti, new_access_jti, new_refresh_jti)
+        # Reuse check, refresh token mark and token links are written atomically,
+        # so only one of concurrent refreshes with the same token can succeed
+        with redis_timer("jwt", "rotate"):
+            rotated = await cls._redis_rotate_script(
+                keys=[f"refresh_{refresh_jti}", f"link_{refresh_jti}", f"link_{new_access_jti}", f"link_{new_refresh_jti}"],
+                args=[refresh_jti, new_access_jti, new_refresh_jti, cls._cache_exp]
+            )
+        if not rotated:
+            logger.error("<JwtManager::refresh_token_pair> Refresh Token Reuse Error! subject=%s", subject)
+            await cls.revoke_token(credentials)
+            raise HTTPException(status_code=401, detail="Invalid bearer token.")
 
         return {"access": new_access_token, "refresh": new_refresh_token}
 
 
     @classmethod
-    def revoke_token(cls, credentials: AuthCredentials):
+    async def revoke_token(cls, credentials: AuthCredentials):
         """
         Revoke the provided token and all linked tokens.
         
         :param `credentials`: Decoded payload of JWT token.
         """
-
-        def revoke_recursively(jti: str, redis_pipeline: Pipeline, revoked: set[str] = set()):
-            tokens_revoked_count = 1
-            cls._redis_blacklist_token(jti, redis_pipeline)
-            token_links = cls._redis_get_links(jti)
-            if token_links:
-                to_revoke = set(token_links) - revoked
-                revoked.update([jti], to_revoke)
-                for jti in to_revoke:
-                    tokens_revoked_count += revoke_recursively(jti, redis_pipeline)
-            return tokens_revoked_count
-        
-        # Start token revocation
-        redis_pipeline = cls._redis_conn.pipeline()
-        tokens_revoked = revoke_recursively(credentials.jti, redis_pipeline)
-        redis_pipeline.execute()
-        logging.info(f"<JwtManager::revoke_token> {tokens_revoked=} subject={credentials.subject}")
+        with redis_timer("jwt", "revoke"):
+            revoked = await cls._redis_revoke_script(
+                keys=[cls._revocation_log],
+                args=[credentials.jti, cls._cache_exp, time.time(), cls._revocation_channel]
+            )
+        revoked = [jti.decode("utf-8") for jti in revoked]
+        cls._cache_revoked_tokens(revoked, time.time())
+        logger.info("<JwtManager::revoke_token> tokens_revoked=%s subject=%s", len(revoked), credentials.subject)
 
 
     @classmethod
-    def _redis_create_token_link(cls, jti_key: str, *jti_args: str):
-        cache_value = ';'.join(jti_args)
-        cls._redis_conn.setex(f"link_{jti_key}", cls._cache_exp, cache_value)
+    def _redis_add_token_link(cls, redis_pipeline: Pipeline, jti_key: str, *jti_args: str):
+        redis_pipeline.sadd(f"link_{jti_key}", *jti_args)
+        redis_pipeline.expire(f"link_{jti_key}", cls._cache_exp)
 
 
     @classmethod
-    def _redis_add_token_link(cls, jti_key: str, *jti_args: str):
-        current_value = cls._redis_conn.get(f"link_{jti_key}")
-        if current_value:
-            new_cache_value = f"{current_value.decode('utf-8')};{';'.join(jti_args)}"
-        else:
-            new_cache_value = ';'.join(jti_args)
-            logging.warning(f"<JwtManager::_redis_add_token_link> Missing token link entry. {jti_key=}")
-        cls._redis_conn.setex(f"link_{jti_key}", cls._cache_exp, new_cache_value)
+    async def _redis_load_revocation_log(cls):
+        since = time.time() - cls._cache_exp
+        with redis_timer("jwt", "load_revocation_log"):
+            entries = await cls._redis_conn.zrangebyscore(cls._revocation_log, since, "+inf", withscores=True)
+        for jti, revoked_at in entries:
+            cls._cache_revoked_tokens([jti.decode("utf-8")], revoked_at)
 
 
     @classmethod
-    def _redis_get_links(cls, jti: str) -> Optional[List[str]]:
-        token_links = cls._redis_conn.get(f"link_{jti}")
-        if token_links:
-            return token_links.decode("utf-8").split(';')
-        return None
-
+    async def _listen_for_revocations(cls):
+        """
+        Keep the local revocation cache in sync with revocations made by other workers.
 
-    @classmethod
-    def _redis_blacklist_token(cls, jti: str, redis_pipeline: Pipeline):
-        redis_pipeline.setex(f"blacklist_{jti}", cls._cache_exp, 1)
+        The revocation log is reloaded on every (re)subscription, so nothing published
+        while disconnected is missed. Liveness is confirmed with pub/sub pings.
+        """
+        ping_interval = cls._revocation_staleness / 2
+        while True:
+            try:
+                async with cls._redis_conn.pubsub() as pubsub:
+                    await pubsub.subscribe(cls._revocation_channel)
+                    await cls._redis_load_revocation_log()
+                    cls._revocation_synced_at = time.monotonic()
+                    last_ping = time.monotonic()
+                    while True:
+                        if time.monotonic() - last_ping >= ping_interval:
+                            await pubsub.ping(message="revocation-sync")
+                            last_ping = time.monotonic()
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=ping_interval)
+                        if message is None:
+                            continue
+                        if message["type"] == "message":
+                            cls._cache_revoked_tokens(message["data"].decode("utf-8").split(';'), time.time())
+                        cls._revocation_synced_at = time.monotonic()
+            except redis.RedisError as e:
+                logger.error("<JwtManager::_listen_for_revocations> %s: %s", type(e).__name__, e)
+                await asyncio.sleep(ping_interval)
 
 
     @classmethod
-    def _redis_check_blacklist(cls, jti: str) -> bool:
-        return cls._redis_conn.exists(f"blacklist_{jti}")
+    def _cache_revoked_tokens(cls, jtis: List[str], revoked_at: float):
+        expires_at = revoked_at + cls._cache_exp
+        for jti in jtis:
+            cls._revoked_cache[jti] = expires_at
+            cls._revoked_cache.move_to_end(jti)
+
+        # Drop expired entries, then the oldest ones if the cache is over its size limit
+        now = time.time()
+        while cls._revoked_cache:
+            jti, oldest_expires_at = next(iter(cls._revoked_cache.items()))
+            if oldest_expires_at > now and len(cls._revoked_cache) <= cls._revoked_cache_size:
+                break
+            cls._revoked_cache.popitem(last=False)
+            if oldest_expires_at > now:
+                # A still valid revocation was evicted, the cache cannot be trusted until it expires
+                cls._revoked_cache_incomplete_until = max(cls._revoked_cache_incomplete_until, oldest_expires_at)
 
 
     @classmethod
-    def _redis_mark_refresh_token(cls, jti: str):
-        cls._redis_conn.setex(f"refresh_{jti}", cls._cache_exp, 1)
+    def _revocation_cache_is_fresh(cls) -> bool:
+        return time.monotonic() - cls._revocation_synced_at <= cls._revocation_staleness \
+            and time.time() >= cls._revoked_cache_incomplete_until
 
 
     @classmethod
-    def _redis_check_refresh_token_reuse(cls, jti: str) -> bool:
-        return cls._redis_conn.exists(f"refresh_{jti}")
-    
+    async def _redis_check_blacklist(cls, jti: str) -> bool:
+        with redis_timer("jwt", "check_blacklist"):
+            return await cls._redis_conn.exists(f"blacklist_{jti}")
+
 
     @classmethod
     def _encode_token(cls, type: TokenType, subject: Dict[str, Union[str, int, float]]) -> Tuple[str, str]:
@@ -287,15 +463,15 @@ class JwtManager:
             return jwt.decode(token, cls._secret, algorithms=cls._algorithm)
         
         except DecodeError as e:
-            logging.error(f"<JwtManager::decode_token> DecodeError: {str(e)}")
+            logger.warning("<JwtManager::decode_token> DecodeError: %s", e)
             raise HTTPException(status_code=401, detail="Invalid bearer token.")
         
         except ExpiredSignatureError as e:
-            logging.error(f"<JwtManager::decode_token> ExpiredSignatureError: {str(e)}")
+            logger.info("<JwtManager::decode_token> ExpiredSignatureError: %s", e)
             raise HTTPException(status_code=401, detail="Invalid bearer token.")
         
         except InvalidTokenError as e:
-            logging.error(f"<JwtManager::decode_token> InvalidTokenError: {str(e)}")
+            logger.warning("<JwtManager::decode_token> InvalidTokenError: %s", e)
             raise HTTPException(status_code=401, detail="Invalid bearer token.")
 
 
@@ -334,11 +510,11 @@ class JwtBearer(HTTPBearer):
         decoded_credentials = AuthCredentials(**JwtManager._decode_token(credentials.credentials))
 
         if self.token_type != decoded_credentials.token_type:
-            logging.error("<JwtBearer> Invalid Token Type.")
+            logger.warning("<JwtBearer> Invalid Token Type.")
             raise HTTPException(status_code=401, detail="Invalid bearer token.")
         
-        if JwtManager._redis_check_blacklist(decoded_credentials.jti):
-            logging.error(f'<JwtBearer> Revoked Token Error subject: {decoded_credentials.subject}.')
+        if await JwtManager.is_token_revoked(decoded_credentials.jti):
+            logger.warning("<JwtBearer> Revoked Token Error subject: %s.", decoded_credentials.subject)
             raise HTTPException(status_code=401, detail="Invalid bearer token.")
         
         return decoded_credentials
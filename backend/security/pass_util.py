@@ -1,17 +1,68 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from typing import Optional
+import asyncio
+import os
 import re
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 specials = re.compile(r'[@_!#$%^&*()<>?/\|}{~:]')
 numbers = re.compile('[0-9]')
 
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+# Argon2 is CPU and memory heavy, it runs in a bounded thread pool (argon2-cffi releases
+# the GIL while hashing) so it never blocks the event loop.
+_executor: Optional[ThreadPoolExecutor] = None
+_max_pending: int = 32
+_pending: int = 0
+
+
+def configure(
+        time_cost: int = 3,
+        memory_cost: int = 65536,
+        parallelism: int = 4,
+        workers: Optional[int] = None,
+        max_pending: int = 32,
+    ):
+    """
+    Set Argon2 cost parameters (`memory_cost` is in KiB, the defaults are argon2-cffi's) and the
+    size of the hashing pool. Every hash runs `parallelism` lanes in threads of its own, so the pool
+    defaults to `cpu_count // parallelism` workers to keep the cores from being oversubscribed.
+    At most `max_pending` hash operations may be running or queued, further calls are
+    rejected with `503 Service Unavailable`.
+    """
+    global pwd_context, _executor, _max_pending
+    pwd_context = CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__time_cost=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+    )
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers=workers or max(1, os.cpu_count() // parallelism), thread_name_prefix="argon2")
+    _max_pending = max_pending
+
+
+async def _run_in_pool(func, *args):
+    global _pending
+    if _pending >= _max_pending:
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again later.", headers={"Retry-After": "1"})
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await _run_in_pool(pwd_context.verify, plain_password, hashed_password)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await _run_in_pool(pwd_context.hash, password)
 
 
 def check_password_complexity(password):
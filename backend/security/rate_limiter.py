@@ -0,0 +1,249 @@
+"""
+Rate limiting with in-process token buckets that are periodically reconciled with Redis.
+
+Each worker decides locally, so a limited request costs no network round trip. Every
+`sync_interval` seconds the tokens consumed since the last sync are sent to Redis in one
+script call, and the local buckets are reset to the shared state of all workers. A bucket
+the worker does not hold yet (new, or dropped after it refilled while idle) is first filled
+from the shared state, which costs one round trip.
+
+Between syncs a worker spends from the shared state it last saw, without knowing what the
+other workers take. A client whose requests are spread over all workers can therefore be
+admitted up to `workers` times its remaining tokens within one sync interval (at most
+`workers * times` requests), and is held to the shared state from the next sync on.
+With one worker the limit is exact. A shorter interval narrows that window at the cost
+of more Redis calls.
+
+Usage:
+    1. Call `TokenBucketLimiter.configure` and `await TokenBucketLimiter.connect()` on startup.
+    2. Declare limits on routes as with `fastapi_limiter`: `Depends(RateLimiter(times=10, seconds=10))`.
+    3. Call `await TokenBucketLimiter.close()` on shutdown.
+"""
+import asyncio
+import logging
+import time
+import redis.asyncio as redis
+
+from fastapi import Request, Response
+from fastapi_limiter import default_identifier, http_default_callback
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics.prometheus import redis_timer
+from lifecycle import is_warmup
+from pools import redis_connection_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated_at", "consumed")
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate                  # Tokens per millisecond
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.consumed = 0                 # Tokens taken since the last sync
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * 1000 * self.rate)
+        self.updated_at = now
+
+
+class TokenBucketLimiter:
+
+    _enabled: bool = True
+    _sync_interval: float
+    _prefix: str
+    _redis_settings: Dict[str, Any]
+    _redis_conn: Optional[redis.Redis] = None
+    _sync_task: Optional[asyncio.Task] = None
+    _buckets: Dict[str, _Bucket] = {}
+
+    # Refills each shared bucket up to the Redis server time, takes the tokens consumed by
+    # the calling worker and returns the remaining tokens (as strings, Lua numbers are truncated).
+    # ARGV: consumed, capacity, refill rate (tokens/ms) for each key in KEYS.
+    _SYNC_SCRIPT = """
+        local time = redis.call('TIME')
+        local now = time[1] * 1000 + math.floor(time[2] / 1000)
+        local remaining = {}
+        for i, key in ipairs(KEYS) do
+            local consumed = tonumber(ARGV[i * 3 - 2])
+            local capacity = tonumber(ARGV[i * 3 - 1])
+            local rate = tonumber(ARGV[i * 3])
+            local state = redis.call('HMGET', key, 'tokens', 'ts')
+            local tokens = tonumber(state[1]) or capacity
+            local ts = tonumber(state[2]) or now
+            tokens = math.max(0, math.min(capacity, tokens + (now - ts) * rate) - consumed)
+            redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+            redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+            remaining[i] = tostring(tokens)
+        end
+        return remaining
+    """
+
+
+    @classmethod
+    def configure(cls,
+            enabled: bool = True,
+            sync_interval: float = 0.5,
+            prefix: str = "rate_limit",
+            redis_host: str = "localhost",
+            redis_port: int = 6379,
+            redis_pass: Optional[str] = None,
+            redis_db_index: int = 1,
+            redis_max_connections: Optional[int] = None,
+            redis_pool_timeout: Optional[float] = None,
+        ):
+        """
+        `sync_interval` is the time in seconds between reconciliations with Redis.
+        With `enabled=False` every request is allowed (e.g. for load tests).
+        """
+        cls._enabled = enabled
+        cls._sync_interval = sync_interval
+        cls._prefix = prefix
+        cls._redis_settings = {
+            "host": redis_host,
+            "port": redis_port,
+            "password": redis_pass,
+            "db": redis_db_index,
+            "max_connections": redis_max_connections,
+            "pool_timeout": redis_pool_timeout,
+        }
+
+
+    @classmethod
+    async def connect(cls):
+        cls._redis_conn = redis.Redis(connection_pool=redis_connection_pool(**cls._redis_settings))
+        cls._sync_script = cls._redis_conn.register_script(cls._SYNC_SCRIPT)
+        cls._sync_task = asyncio.create_task(cls._run())
+
+
+    @classmethod
+    async def close(cls):
+        if cls._sync_task is not None:
+            cls._sync_task.cancel()
+            try:
+                await cls._sync_task
+            except asyncio.CancelledError:
+                pass
+            cls._sync_task = None
+        await cls._sync()
+        if cls._redis_conn is not None:
+            await cls._redis_conn.aclose(close_connection_pool=True)
+            cls._redis_conn = None
+        cls._buckets.clear()
+
+
+    @classmethod
+    async def take(cls, key: str, times: int, milliseconds: int) -> int:
+        """
+        Take a token from the bucket of `key`, which holds up to `times` tokens refilled
+        over `milliseconds`. Returns 0 if allowed, otherwise milliseconds until a token is available.
+        """
+        if not cls._enabled:
+            return 0
+        bucket = cls._buckets.get(key)
+        if bucket is None:
+            bucket = await cls._fill(key, times, milliseconds)
+        bucket.refill(time.monotonic())
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.consumed += 1
+            return 0
+        return max(1, int((1 - bucket.tokens) / bucket.rate))
+
+
+    @classmethod
+    async def _fill(cls, key: str, times: int, milliseconds: int) -> _Bucket:
+        """New local bucket of `key` holding the tokens of the shared bucket, full if Redis is unavailable."""
+        bucket = _Bucket(times, times / milliseconds)
+        if cls._redis_conn is not None:
+            try:
+                with redis_timer("rate_limiter", "fill"):
+                    tokens, = await cls._sync_script(keys=[f"{cls._prefix}:{key}"], args=[0, bucket.capacity, repr(bucket.rate)])
+                bucket.tokens = float(tokens)
+            except redis.RedisError as e:
+                logger.error("<TokenBucketLimiter::_fill> %s: %s", type(e).__name__, e)
+        # Concurrent requests of the same key may have filled it meanwhile
+        return cls._buckets.setdefault(key, bucket)
+
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await asyncio.sleep(cls._sync_interval)
+            await cls._sync()
+
+
+    @classmethod
+    async def _sync(cls):
+        if cls._redis_conn is None or not cls._buckets:
+            return
+
+        # Full buckets with nothing to report hold no information, so they are dropped
+        now = time.monotonic()
+        keys: List[str] = []
+        for key, bucket in list(cls._buckets.items()):
+            bucket.refill(now)
+            if bucket.consumed:
+                keys.append(key)
+            elif bucket.tokens >= bucket.capacity:
+                del cls._buckets[key]
+        if not keys:
+            return
+
+        sent = {key: cls._buckets[key].consumed for key in keys}
+        args = []
+        for key in keys:
+            bucket = cls._buckets[key]
+            bucket.consumed = 0
+            args.extend((sent[key], bucket.capacity, repr(bucket.rate)))
+        try:
+            with redis_timer("rate_limiter", "sync"):
+                remaining = await cls._sync_script(keys=[f"{cls._prefix}:{key}" for key in keys], args=args)
+        except redis.RedisError as e:
+            logger.error("<TokenBucketLimiter::_sync> %s: %s", type(e).__name__, e)
+            for key in keys:
+                cls._buckets[key].consumed += sent[key]
+            return
+
+        # Tokens taken while the script was running are not in the shared state yet
+        now = time.monotonic()
+        for key, tokens in zip(keys, remaining):
+            bucket = cls._buckets[key]
+            bucket.tokens = max(0.0, float(tokens) - bucket.consumed)
+            bucket.updated_at = now
+
+
+class RateLimiter:
+    """
+    Route dependency with the same declaration as `fastapi_limiter.depends.RateLimiter`,
+    backed by `TokenBucketLimiter`. `times` requests are allowed per period, refilled gradually.
+    """
+
+    def __init__(
+        self,
+        times: int = 1,
+        milliseconds: int = 0,
+        seconds: int = 0,
+        minutes: int = 0,
+        hours: int = 0,
+        identifier: Optional[Callable] = None,
+        callback: Optional[Callable] = None,
+    ):
+        self.times = times
+        self.milliseconds = milliseconds + 1000 * seconds + 60000 * minutes + 3600000 * hours
+        self.identifier = identifier or default_identifier
+        self.callback = callback or http_default_callback
+
+
+    async def __call__(self, request: Request, response: Response):
+        if is_warmup(request.scope):
+            return
+        # Limits declared on the same path share a bucket only if they are the same rule
+        key = f"{await self.identifier(request)}:{self.times}/{self.milliseconds}"
+        pexpire = await TokenBucketLimiter.take(key, self.times, self.milliseconds)
+        if pexpire != 0:
+            return await self.callback(request, response, pexpire)
@@ -0,0 +1,50 @@
+"""
+Production launch mode.
+
+    python server.py
+
+Runs the app with uvicorn in `server_workers` processes. Every worker sizes its database and
+Redis pools from the connection budgets of the whole server (see `pools.py`), so Postgres and
+Redis see at most `db_max_connections` and `redis_max_connections` connections in total.
+Every worker gets at least one database connection, and startup fails when
+`redis_max_connections` is below 2 connections per Redis client per worker.
+
+With several workers, Prometheus metrics are shared through `PROMETHEUS_MULTIPROC_DIR`
+(a temporary directory, removed on exit, unless set), so `/metrics` reports all workers.
+"""
+import glob
+import os
+import shutil
+import tempfile
+import uvicorn
+
+from config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS
+
+
+def prepare_metrics_dir():
+    """Create a temporary metrics directory, returned for removal, or clear the configured one."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory is None:
+        if SERVER_WORKERS == 1:
+            return None
+        # Must be set before the workers import prometheus_client
+        directory = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="pollwizard-metrics-")
+        return directory
+    # Files left by a previous run would be counted as live workers
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+    return None
+
+
+def main():
+    temporary_dir = prepare_metrics_dir()
+    try:
+        uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS)
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
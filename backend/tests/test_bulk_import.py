@@ -0,0 +1,45 @@
+import json
+import pytest
+
+from security.fastapi_jwt_redis import JwtManager
+from models.user.model import User
+from routers import polls as pollsRouter
+
+
+POLL = json.dumps({"title": "Imported", "options": ["Yes", "No"]})
+
+
+@pytest.fixture
+async def auth(client, sessionmaker):
+    async with sessionmaker() as db:
+        user = User(name="importer", email="importer@example.com", password="-")
+        db.add(user)
+        await db.commit()
+    tokens = await JwtManager.generate_token_pair({"user_id": user.id})
+    return {"Authorization": f"Bearer {tokens['access']}"}
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def test_import_across_chunks(client, auth):
+    body = f"{POLL}\nnot json\n\n{POLL}".encode()
+    response = await client.post("/polls/bulk", content=chunks(body[:5], body[5:40], body[40:]), headers=auth)
+    assert response.status_code == 201, response.text
+    assert response.json()["created"] == 2
+    assert [error["line"] for error in response.json()["errors"]] == [2]
+
+
+async def test_line_too_long(client, auth, monkeypatch):
+    monkeypatch.setattr(pollsRouter, "POLLS_IMPORT_MAX_LINE_BYTES", 100)
+    response = await client.post("/polls/bulk", content=chunks(f"{POLL}\n".encode(), b"x" * 60, b"x" * 60), headers=auth)
+    assert response.status_code == 413
+    assert response.json()["detail"]["created"] == 0     # The partial batch is not inserted
+
+
+async def test_too_many_polls(client, auth, monkeypatch):
+    monkeypatch.setattr(pollsRouter, "POLLS_IMPORT_MAX_POLLS", 2)
+    response = await client.post("/polls/bulk", content="\n".join([POLL] * 3), headers=auth)
+    assert response.status_code == 413
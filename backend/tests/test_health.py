@@ -0,0 +1,38 @@
+import pytest
+
+from prometheus_client import REGISTRY
+
+from main import app
+from lifecycle import Readiness
+from conftest import REDIS_SERVICES
+
+
+@pytest.fixture
+async def readiness(client, engine):
+    Readiness.configure(engine=engine, db_connections=1, redis_services=REDIS_SERVICES, paths=["/polls/all"])
+    yield Readiness
+    await Readiness.stop()
+
+
+async def test_live(client):
+    response = await client.get("/health/live")
+    assert response.status_code == 200
+
+
+async def test_not_ready_before_warm_up(client, readiness):
+    response = await client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["warmup"] == "pending"
+
+
+async def test_ready_after_warm_up(client, readiness, query_counter):
+    labels = {"method": "GET", "route": "/polls/all", "status": "200"}
+    requests_before = REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0
+    with query_counter.measure() as statements:
+        await readiness.start(app)
+    assert any("FROM poll" in statement for statement in statements), "warm-up paths were not requested"
+    assert (REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0) == requests_before
+
+    response = await client.get("/health/ready")
+    assert response.status_code == 200, response.json()
+    assert set(response.json()["checks"]) == {"warmup", "database"} | {f"redis:{s.__name__}" for s in REDIS_SERVICES}
@@ -0,0 +1,168 @@
+"""
+SQL query budgets of the API endpoints.
+
+Every endpoint is called against datasets of growing size. The test fails when an endpoint
+issues more statements than its budget, or when its statement count grows with the data
+(e.g. a query per poll or per ID).
+"""
+import json
+import pytest
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from security.fastapi_jwt_redis import JwtManager
+from security.pass_util import get_password_hash
+from models.user.model import User
+from models.poll.model import Poll
+from models.poll_options.model import PollOptions
+from models.poll_votes.model import PollVotes
+
+
+DATASET_SIZES = (4, 40)     # Polls per dataset
+OPTIONS_PER_POLL = 3
+VOTERS = 6
+PASSWORD = "Secret_Pass1!"
+
+
+class Dataset:
+    """
+    Seeded data: `VOTERS` users, the first one (`alice`) authenticates the requests.
+    Polls are spread over the users, each with `OPTIONS_PER_POLL` options and a vote from every user.
+    """
+
+    def __init__(self, sessionmaker):
+        self._sessionmaker = sessionmaker
+        self.users: List[User] = []
+        self.polls: List[Poll] = []
+        self.options: Dict[int, List[int]] = {}
+
+
+    async def setup(self):
+        password = await get_password_hash(PASSWORD)
+        async with self._sessionmaker() as db:
+            self.users = [User(name=f"user{i}", email=f"user{i}@example.com", password=password) for i in range(VOTERS)]
+            self.users[0].name, self.users[0].email = "alice", "alice@example.com"
+            db.add_all(self.users)
+            await db.commit()
+        self.tokens = await JwtManager.generate_token_pair({"user_id": self.users[0].id})
+
+
+    async def grow(self, polls: int):
+        while len(self.polls) < polls:
+            await self.add_poll(self.users[len(self.polls) % VOTERS].id, votes=True)
+
+
+    async def add_poll(self, user_id: int, votes: bool = False) -> Poll:
+        async with self._sessionmaker() as db:
+            poll = Poll(title=f"Poll {len(self.polls)}", user_id=user_id)
+            db.add(poll)
+            await db.flush()
+            options = [PollOptions(value=f"Option {i}", poll_id=poll.id) for i in range(OPTIONS_PER_POLL)]
+            db.add_all(options)
+            await db.flush()
+            if votes:
+                for i, user in enumerate(self.users):
+                    option = options[i % OPTIONS_PER_POLL]
+                    db.add(PollVotes(user_id=user.id, poll_id=poll.id, poll_option_id=option.id))
+                    option.vote_count += 1
+                poll.vote_count = len(self.users)
+            await db.commit()
+        self.polls.append(poll)
+        self.options[poll.id] = [option.id for option in options]
+        return poll
+
+
+    @property
+    def auth(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens['access']}"}
+
+
+@dataclass
+class Endpoint:
+    name: str
+    budget: int
+    call: Callable[[Any, Dataset, Dict[str, Any]], Awaitable[Any]]
+    # Prepares per-call data outside of the measured request
+    prepare: Optional[Callable[[Dataset], Awaitable[Dict[str, Any]]]] = None
+
+
+async def fresh_poll(dataset: Dataset):
+    poll = await dataset.add_poll(dataset.users[0].id)
+    return {"poll": poll, "option_id": dataset.options[poll.id][0]}
+
+
+async def fresh_refresh_token(dataset: Dataset):
+    return {"tokens": await JwtManager.generate_token_pair({"user_id": dataset.users[0].id})}
+
+
+NEW_POLL = {"title": "New poll", "options": ["Yes", "No"]}
+
+ENDPOINTS = [
+    Endpoint("GET /polls/", 2,
+        lambda client, data, ctx: client.get("/polls/", params={"poll_id": data.polls[0].id})),
+    Endpoint("GET /polls/all", 2,
+        lambda client, data, ctx: client.get("/polls/all")),
+    Endpoint("GET /polls/user", 2,
+        lambda client, data, ctx: client.get("/polls/user", params={"username": "alice"})),
+    Endpoint("POST /polls/", 3,
+        lambda client, data, ctx: client.post("/polls/", json=NEW_POLL, headers=data.auth)),
+    Endpoint("POST /polls/bulk", 3,
+        lambda client, data, ctx: client.post(
+            "/polls/bulk", content="\n".join(json.dumps(NEW_POLL) for _ in range(3)), headers=data.auth)),
+    Endpoint("POST /polls/vote", 5,
+        lambda client, data, ctx: client.post(
+            "/polls/vote", params={"option_id": ctx["option_id"]}, headers=data.auth),
+        prepare=fresh_poll),
+    Endpoint("GET /polls/my-votes", 2,
+        lambda client, data, ctx: client.get(
+            "/polls/my-votes", params={"poll_ids": ",".join(str(poll.id) for poll in data.polls)}, headers=data.auth)),
+    Endpoint("DELETE /polls/", 3,
+        lambda client, data, ctx: client.delete("/polls/", params={"poll_id": ctx["poll"].id}, headers=data.auth),
+        prepare=fresh_poll),
+    Endpoint("GET /users/", 1,
+        lambda client, data, ctx: client.get("/users/", headers=data.auth)),
+    Endpoint("POST /users/signup", 4,
+        lambda client, data, ctx: client.post("/users/signup", json={
+            "name": f"new_{len(data.polls)}", "email": f"new_{len(data.polls)}@example.com", "password": PASSWORD
+        })),
+    Endpoint("POST /users/login", 1,
+        lambda client, data, ctx: client.post(
+            "/users/login", json={"email": "alice@example.com", "password": PASSWORD})),
+    Endpoint("POST /users/refresh", 0,
+        lambda client, data, ctx: client.post(
+            "/users/refresh", headers={"Authorization": f"Bearer {ctx['tokens']['refresh']}"}),
+        prepare=fresh_refresh_token),
+    Endpoint("POST /users/logout", 0,
+        lambda client, data, ctx: client.post(
+            "/users/logout", headers={"Authorization": f"Bearer {ctx['tokens']['access']}"}),
+        prepare=fresh_refresh_token),
+]
+
+
+@pytest.fixture
+async def dataset(client, sessionmaker):
+    dataset = Dataset(sessionmaker)
+    await dataset.setup()
+    return dataset
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS, ids=lambda endpoint: endpoint.name)
+async def test_query_budget(endpoint: Endpoint, client, dataset, query_counter, reset_caches):
+    counts = {}
+    for size in DATASET_SIZES:
+        await dataset.grow(size)
+        ctx = await endpoint.prepare(dataset) if endpoint.prepare else {}
+        await reset_caches()
+
+        with query_counter.measure() as statements:
+            response = await endpoint.call(client, dataset, ctx)
+
+        assert response.status_code < 300, response.text
+        counts[size] = len(statements)
+        assert len(statements) <= endpoint.budget, (
+            f"{endpoint.name} issued {len(statements)} SQL statements (budget {endpoint.budget}) "
+            f"with {size} polls:\n" + "\n".join(statements)
+        )
+
+    assert len(set(counts.values())) == 1, f"{endpoint.name} SQL statement count grows with data: {counts}"
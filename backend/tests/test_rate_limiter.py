@@ -0,0 +1,12 @@
+from security.rate_limiter import TokenBucketLimiter
+
+
+async def test_new_bucket_starts_from_shared_state(client):
+    assert [await TokenBucketLimiter.take("client", 3, 60000) for _ in range(3)] == [0, 0, 0]
+    assert await TokenBucketLimiter.take("client", 3, 60000) > 0
+    await TokenBucketLimiter._sync()
+
+    # Another worker, or this one after dropping the bucket, sees the tokens already taken
+    TokenBucketLimiter._buckets.clear()
+    assert await TokenBucketLimiter.take("client", 3, 60000) > 0
+    assert await TokenBucketLimiter.take("other", 3, 60000) == 0
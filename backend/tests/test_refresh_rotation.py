@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+import fakeredis
+
+from fastapi import HTTPException
+from fakeredis.aioredis import FakeAsyncRedisConnection
+
+from security.fastapi_jwt_redis import JwtManager, AuthCredentials, TokenType
+
+
+PARALLEL_REFRESHES = 20
+
+
+@pytest.fixture
+async def jwt_manager():
+    JwtManager.configure(secret="test-secret", access_expiration=60, refresh_expiration=600)
+    JwtManager._redis_settings.update(connection_class=FakeAsyncRedisConnection, server=fakeredis.FakeServer())
+    JwtManager._revoked_cache.clear()
+    await JwtManager.connect()
+    yield JwtManager
+    await JwtManager.close()
+
+
+def decode(token: str) -> AuthCredentials:
+    return AuthCredentials(**JwtManager._decode_token(token))
+
+
+async def refresh_in_parallel(credentials: AuthCredentials):
+    return await asyncio.gather(
+        *(JwtManager.refresh_token_pair(credentials) for _ in range(PARALLEL_REFRESHES)),
+        return_exceptions=True
+    )
+
+
+async def test_refresh_token_rotates_once(jwt_manager):
+    tokens = await jwt_manager.generate_token_pair({"user_id": 1, "username": "bob"})
+    credentials = decode(tokens["refresh"])
+
+    results = await refresh_in_parallel(credentials)
+
+    winners = [result for result in results if isinstance(result, dict)]
+    losers = [result for result in results if isinstance(result, HTTPException)]
+    assert len(winners) == 1
+    assert len(losers) == PARALLEL_REFRESHES - 1
+    assert all(error.status_code == 401 for error in losers)
+
+
+async def test_refresh_token_reuse_revokes_rotated_pair(jwt_manager):
+    tokens = await jwt_manager.generate_token_pair({"user_id": 1, "username": "bob"})
+    credentials = decode(tokens["refresh"])
+
+    results = await refresh_in_parallel(credentials)
+
+    winner = next(result for result in results if isinstance(result, dict))
+    for token in (tokens["access"], winner["access"], winner["refresh"]):
+        assert await jwt_manager.is_token_revoked(decode(token).jti)
+
+
+async def test_refresh_token_rotation_links_pair(jwt_manager):
+    tokens = await jwt_manager.generate_token_pair({"user_id": 1, "username": "bob"})
+    credentials = decode(tokens["refresh"])
+
+    new_tokens = await jwt_manager.refresh_token_pair(credentials)
+    await jwt_manager.revoke_token(decode(new_tokens["access"]))
+
+    assert decode(new_tokens["refresh"]).token_type == TokenType.REFRESH
+    for token in (tokens["access"], tokens["refresh"], new_tokens["refresh"]):
+        assert await jwt_manager.is_token_revoked(decode(token).jti)
+
+
+async def test_refresh_token_rotation_upgrades_string_links(jwt_manager):
+    tokens = await jwt_manager.generate_token_pair({"user_id": 1, "username": "bob"})
+    credentials = decode(tokens["refresh"])
+    access_jti = decode(tokens["access"]).jti
+    # Links written before they were stored as sets
+    await jwt_manager._redis_conn.delete(f"link_{credentials.jti}")
+    await jwt_manager._redis_conn.setex(f"link_{credentials.jti}", 600, f"{access_jti};")
+
+    new_tokens = await jwt_manager.refresh_token_pair(credentials)
+
+    links = await jwt_manager._redis_conn.smembers(f"link_{credentials.jti}")
+    assert {jti.decode("utf-8") for jti in links} == {
+        access_jti, decode(new_tokens["access"]).jti, decode(new_tokens["refresh"]).jti
+    }
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.requests import Request
+
+from cache.response_cache import ResponseCache
+from security.fastapi_jwt_redis import JwtManager
+from models.user.model import User
+from models.poll.model import Poll
+from models.poll_options.model import PollOptions
+from models.replicas import ReplicaRouter
+
+
+@pytest.fixture
+async def replicas():
+    primary = create_async_engine("sqlite+aiosqlite://")
+    engines = [create_async_engine("sqlite+aiosqlite://") for _ in range(2)]
+    app_primary, app_redis_settings = ReplicaRouter._primary, ReplicaRouter._redis_settings
+    ReplicaRouter.configure(primary=async_sessionmaker(bind=primary), replicas=engines, retry_after=60)
+    yield primary, engines
+    await ReplicaRouter.close()
+    await primary.dispose()
+    ReplicaRouter.configure(primary=app_primary)
+    ReplicaRouter._redis_settings = app_redis_settings
+
+
+async def bound_engine(**kwargs):
+    async with ReplicaRouter.session(**kwargs) as db:
+        return db.bind
+
+
+async def test_round_robin(replicas):
+    _, engines = replicas
+    picked = [await bound_engine() for _ in range(4)]
+    assert set(picked) == set(engines)
+    assert picked[0] is picked[2] and picked[1] is picked[3]
+
+
+async def test_least_connections(replicas):
+    _, engines = replicas
+    ReplicaRouter._selection = "least_connections"
+    async with ReplicaRouter.session() as busy:
+        assert [await bound_engine() for _ in range(3)] == [engine for engine in engines if engine is not busy.bind] * 3
+
+
+async def test_failed_replica_falls_back(replicas):
+    primary, engines = replicas
+    with pytest.raises(OSError):
+        async with ReplicaRouter.session() as db:
+            raise ConnectionRefusedError()
+    failed = db.bind
+    assert [await bound_engine() for _ in range(3)] == [engine for engine in engines if engine is not failed] * 3
+
+    with pytest.raises(OSError):
+        async with ReplicaRouter.session() as db:
+            raise ConnectionRefusedError()
+    assert await bound_engine() is primary
+
+
+async def test_unreachable_replica_is_skipped(replicas):
+    primary, engines = replicas
+
+    async def refuse():
+        raise ConnectionRefusedError()
+
+    def make_unreachable(replica):
+        replica.sessionmaker = async_sessionmaker(bind=create_async_engine("sqlite+aiosqlite://", async_creator=refuse))
+
+    make_unreachable(ReplicaRouter._replicas[0])
+    assert [await bound_engine() for _ in range(3)] == [engines[1]] * 3
+    assert ReplicaRouter._replicas[0].retry_at is not None
+
+    make_unreachable(ReplicaRouter._replicas[1])
+    assert await bound_engine() is primary
+
+
+async def test_read_your_writes(replicas, client):
+    assert not await ReplicaRouter.wrote_recently(1)
+    await ReplicaRouter.record_write(1)
+    assert await ReplicaRouter.wrote_recently(1)
+    assert not await ReplicaRouter.wrote_recently(2)
+
+    ReplicaRouter._read_your_writes_window = 0.001
+    await ReplicaRouter.record_write(2)
+    await asyncio.sleep(0.01)
+    assert not await ReplicaRouter.wrote_recently(2)
+
+
+async def test_only_successful_writes_are_recorded(replicas, client, sessionmaker):
+    async with sessionmaker() as db:
+        user = User(name="voter", email="voter@example.com", password="-")
+        db.add(user)
+        await db.flush()
+        poll = Poll(title="Poll", user_id=user.id)
+        db.add(poll)
+        await db.flush()
+        option = PollOptions(value="A", poll_id=poll.id)
+        db.add(option)
+        await db.commit()
+    headers = {"Authorization": f"Bearer {(await JwtManager.generate_token_pair({'user_id': user.id}))['access']}"}
+
+    response = await client.post("/polls/vote", params={"option_id": option.id + 1}, headers=headers)
+    assert response.status_code == 422
+    assert not await ReplicaRouter.wrote_recently(user.id)
+
+    response = await client.post("/polls/vote", params={"option_id": option.id}, headers=headers)
+    assert response.status_code == 201, response.text
+    assert await ReplicaRouter.wrote_recently(user.id)
+
+
+async def test_replica_responses_not_cached_after_invalidation(client, monkeypatch):
+    monkeypatch.setattr(ResponseCache, "_replica_lag_ms", 60000)
+    request = Request({"type": "http", "path": "/polls/all", "query_string": b"", "headers": []})
+    builds = []
+
+    async def build():
+        builds.append(len(builds))
+        return builds[-1]
+
+    async def respond(replica: bool):
+        return (await ResponseCache.respond(request, ["feed"], build, replica=replica)).body
+
+    await ResponseCache.invalidate("feed")
+    assert [await respond(replica=True) for _ in range(2)] == [b"0", b"1"]
+    assert [await respond(replica=False) for _ in range(2)] == [b"2", b"2"]
+
+    monkeypatch.setattr(ResponseCache, "_replica_lag_ms", 50)
+    await ResponseCache.invalidate("feed")
+    await asyncio.sleep(0.1)
+    assert [await respond(replica=True) for _ in range(2)] == [b"3", b"3"]
+
+
+async def test_session_reads(replicas):
+    async with ReplicaRouter.session() as db:
+        assert (await db.execute(text("SELECT 1"))).scalar() == 1
@@ -0,0 +1,92 @@
+"""
+Votes through `VoteBatcher`: concurrent requests are written as one batch, and every caller
+gets its own result. Run with `TEST_DATABASE_URL` to cover the Postgres `ON CONFLICT ON CONSTRAINT` insert.
+"""
+import asyncio
+import pytest
+from datetime import datetime
+
+from sqlalchemy import select
+
+from security.fastapi_jwt_redis import JwtManager
+from models.user.model import User
+from models.poll.model import Poll
+from models.poll_options.model import PollOptions
+from models.poll_votes.model import PollVotes
+from models.poll_votes.batcher import VoteBatcher
+from models.poll_votes import batcher, crud as voteCrud
+from routers import polls as pollsRouter
+
+
+@pytest.fixture
+async def polls(sessionmaker):
+    async with sessionmaker() as db:
+        users = [User(name=f"voter{i}", email=f"voter{i}@example.com", password="-") for i in range(4)]
+        db.add_all(users)
+        await db.flush()
+        open_poll = Poll(title="Open", user_id=users[0].id)
+        deleted_poll = Poll(title="Deleted", user_id=users[0].id, deleted_at=datetime.now())
+        db.add_all([open_poll, deleted_poll])
+        await db.flush()
+        options = [PollOptions(value=value, poll_id=open_poll.id) for value in ("A", "B")]
+        deleted_option = PollOptions(value="C", poll_id=deleted_poll.id)
+        db.add_all([*options, deleted_option])
+        await db.flush()
+        # voter3 has already voted
+        db.add(PollVotes(user_id=users[3].id, poll_id=open_poll.id, poll_option_id=options[0].id))
+        options[0].vote_count, open_poll.vote_count = 1, 1
+        await db.commit()
+    tokens = [(await JwtManager.generate_token_pair({"user_id": user.id}))["access"] for user in users]
+    return tokens, open_poll, [option.id for option in options], deleted_option.id
+
+
+@pytest.fixture
+async def vote_batcher(client, sessionmaker, monkeypatch):
+    monkeypatch.setattr(batcher, "AsyncSessionLocal", sessionmaker)
+    monkeypatch.setattr(pollsRouter, "VOTE_BATCHING", True)
+    VoteBatcher.configure(batch_size=100, interval_ms=200)
+    await VoteBatcher.start()
+    yield VoteBatcher
+    await VoteBatcher.stop()
+
+
+async def test_concurrent_votes_are_batched(client, polls, vote_batcher, sessionmaker, query_counter):
+    tokens, poll, (option_a, option_b), deleted_option = polls
+
+    def vote(token, option_id):
+        return client.post("/polls/vote", params={"option_id": option_id}, headers={"Authorization": f"Bearer {token}"})
+
+    with query_counter.measure() as statements:
+        responses = await asyncio.gather(
+            vote(tokens[0], option_a),
+            vote(tokens[1], option_b),
+            vote(tokens[0], option_b),      # Second vote of voter0 in the same batch
+            vote(tokens[3], option_a),      # Already voted
+            vote(tokens[2], deleted_option),
+            vote(tokens[2], 999_999),
+        )
+
+    statuses = [response.status_code for response in responses]
+    assert sorted(statuses[:3]) == [201, 201, 422]
+    assert statuses[3:] == [422, 422, 422]
+    assert sum("INSERT INTO poll_votes" in statement for statement in statements) == 1
+
+    async with sessionmaker() as db:
+        counts = dict((await db.execute(select(PollOptions.id, PollOptions.vote_count))).all())
+        poll_count = await db.scalar(select(Poll.vote_count).where(Poll.id == poll.id))
+        stored = len((await db.execute(select(PollVotes.id).where(PollVotes.poll_id == poll.id))).all())
+    assert stored == 3 and poll_count == 3
+    assert counts[option_a] + counts[option_b] == 3
+
+
+async def test_submit_without_running_batcher(client, polls, sessionmaker, monkeypatch):
+    monkeypatch.setattr(batcher, "AsyncSessionLocal", sessionmaker)
+    _, poll, (option_a, _), _ = polls
+    async with sessionmaker() as db:
+        user_id = await db.scalar(select(User.id).where(User.name == "voter1"))
+
+    vote = await asyncio.wait_for(VoteBatcher.submit(user_id, option_a), timeout=5)
+    assert vote["poll_id"] == poll.id
+
+    with pytest.raises(voteCrud.VoteRejected):
+        await asyncio.wait_for(VoteBatcher.submit(user_id, option_a), timeout=5)
@@ -1,4 +1,3 @@
-
 import PollForm from "../components/PollForm";
 import { PollFormProps } from "../components/PollForm";
 import { useState, useEffect } from 'react';
@@ -7,41 +6,62 @@ import { useIsAuthenticated } from 'react-auth-kit';
 import axios from "axios";
 import { toast } from 'react-toastify'
 
+interface PollsPage {
+    polls: PollFormProps[],
+    next_cursor: string | null
+}
+
 function PollsContainer(props: {endpoint: string}) {
     const [data, setData] = useState<PollFormProps[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
 
     const isAuthenticated = useIsAuthenticated()
     const authHeader = useAuthHeader()
 
-    const fetchData = async () : Promise<PollFormProps[]> => {
+    const fetchData = async (cursor: string | null) : Promise<PollsPage> => {
         try {
-            const pollsResponse = await axios.get(`polls/${props.endpoint}`)
+            const pollsResponse = await axios.get(`polls/${props.endpoint}`, {
+                params: cursor ? { cursor: cursor } : {}
+            })
+            // Single poll view returns a plain list, feeds return a page with a cursor
+            const page: PollsPage = Array.isArray(pollsResponse.data)
+                ? { polls: pollsResponse.data, next_cursor: null }
+                : pollsResponse.data
 
-            if (isAuthenticated()) {
+            if (isAuthenticated() && page.polls.length) {
                 const votesResponse = await axios.get(`polls/my-votes`, {
                     params: {
-                        poll_ids: pollsResponse.data.map((entry: PollFormProps) => entry.id).join(',')
+                        poll_ids: page.polls.map((entry: PollFormProps) => entry.id).join(',')
                     },
                     headers: { Authorization: authHeader() }
                 })
-                return pollsResponse.data.map((entry: PollFormProps) => ({
+                page.polls = page.polls.map((entry: PollFormProps) => ({
                     ...entry,
                     _voted_for: votesResponse.data[entry.id]
                 }))
-            } else {
-                return pollsResponse.data
             }
+            return page
         } catch (err: any) {
             toast.error(err.response!.data.detail, {
                 position: "top-center",
                 autoClose: 2000,
             });
         }
-        return []
+        return { polls: [], next_cursor: null }
     };
 
+    const loadMore = () => {
+        fetchData(nextCursor).then((page) => {
+            setData(data.concat(page.polls))
+            setNextCursor(page.next_cursor)
+        })
+    }
+
     useEffect(() => {
-        fetchData().then((data) => setData(data))
+        fetchData(null).then((page) => {
+            setData(page.polls)
+            setNextCursor(page.next_cursor)
+        })
     }, [props.endpoint])
 
     return (
@@ -55,8 +75,15 @@ function PollsContainer(props: {endpoint: string}) {
                 />
             ))
         }
+        {
+            nextCursor && (
+                <div className="text-center my-3">
+                    <button className="btn btn-success" onClick={() => loadMore()}>Load more</button>
+                </div>
+            )
+        }
         </div>
     );
 }
 
-export default PollsContainer;
\ No newline at end of file
+export default PollsContainer;